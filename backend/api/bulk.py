@@ -0,0 +1,154 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from api.serializers import RecipeCreateSerializer
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from recipes.signals import recipes_created
+from recipes.tasks import update_signature_batch
+
+CREATED = 'created'
+FAILED = 'failed'
+
+
+def collect_ids(items, name):
+    """
+    Ids of ingredients or tags mentioned anywhere in the batch.
+
+    Malformed values are skipped here and reported by the serializer.
+    """
+    ids = set()
+    for item in items:
+        values = item.get(name) if isinstance(item, dict) else None
+        if not isinstance(values, list):
+            continue
+        for value in values:
+            if name == 'ingredients':
+                value = value.get('id') if isinstance(value, dict) else None
+            try:
+                ids.add(int(value))
+            except (TypeError, ValueError):
+                continue
+    return ids
+
+
+def create_recipes(items, request):
+    """
+    Validate and create a batch of recipes, one result per item.
+
+    Ingredients and tags of the whole batch are loaded with one query
+    each, duplicates are found with one query, and recipes, ingredient
+    rows and tag rows are inserted with one bulk_create each.
+    """
+    context = {
+        'request': request,
+        'ingredient_map': Ingredient.objects.in_bulk(
+            collect_ids(items, 'ingredients')),
+        'tag_map': Tag.objects.in_bulk(collect_ids(items, 'tags')),
+    }
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = RecipeCreateSerializer(data=item, context=context)
+        if not serializer.is_valid():
+            results[index] = {'status': FAILED, 'errors': serializer.errors}
+            continue
+        data = serializer.validated_data
+        content_hash = Recipe.make_content_hash(
+            data['name'], data['text'], data['cooking_time'])
+        if content_hash in valid:
+            results[index] = duplicate()
+            continue
+        valid[content_hash] = index, data
+    for content_hash in existing_hashes(valid):
+        results[valid.pop(content_hash)[0]] = duplicate()
+    if valid:
+        save(valid, results, request.user)
+    return results
+
+
+def existing_hashes(content_hashes):
+    return Recipe.objects.filter(
+        content_hash__in=content_hashes).values_list('content_hash', flat=True)
+
+
+def duplicate():
+    return {'status': FAILED,
+            'errors': {'non_field_errors': ['Recipe already exist.']}}
+
+
+def insert(recipes, valid, results):
+    """
+    Insert the recipes and return the ones inserted.
+
+    One bulk_create inserts them all unless a recipe with the same
+    content was saved since the duplicate check; then every recipe is
+    retried in its own savepoint and only the conflicting ones are
+    reported as duplicates. Other integrity errors are raised.
+    """
+    try:
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+        return recipes
+    except IntegrityError as error:
+        if not Recipe.is_duplicate_error(error):
+            raise
+    inserted = []
+    for recipe in recipes:
+        try:
+            with transaction.atomic():
+                Recipe.objects.bulk_create([recipe])
+        except IntegrityError as error:
+            if not Recipe.is_duplicate_error(error):
+                raise
+            recipe.image.delete(save=False)
+            results[valid[recipe.content_hash][0]] = duplicate()
+        else:
+            inserted.append(recipe)
+    return inserted
+
+
+def save(valid, results, author):
+    now = timezone.now()
+    recipes = [
+        Recipe(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            image=data['image'],
+            content_hash=content_hash,
+            popularity=Recipe.popularity_score(0, 0, now),
+        )
+        for content_hash, (_, data) in valid.items()
+    ]
+    try:
+        with transaction.atomic():
+            recipes = insert(recipes, valid, results)
+            if not recipes:
+                return
+            if any(recipe.pk is None for recipe in recipes):
+                pks = dict(Recipe.objects.filter(
+                    content_hash__in=valid).values_list('content_hash', 'pk'))
+                for recipe in recipes:
+                    recipe.pk = pks[recipe.content_hash]
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe_id=recipe.pk,
+                                   ingredient=item['ingredient'],
+                                   amount=item['amount'])
+                for recipe in recipes
+                for item in valid[recipe.content_hash][1]['ingredients'])
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag=tag)
+                for recipe in recipes
+                for tag in valid[recipe.content_hash][1]['tags'])
+            update_signature_batch.enqueue(
+                [recipe.pk for recipe in recipes])
+    except IntegrityError:
+        for recipe in recipes:
+            recipe.image.delete(save=False)
+        raise
+    recipes_created.send(sender=Recipe, recipes=recipes,
+                         recipe_ids=[recipe.pk for recipe in recipes])
+    for recipe in recipes:
+        results[valid[recipe.content_hash][0]] = {
+            'status': CREATED, 'id': recipe.pk}
@@ -0,0 +1,156 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api import revisions
+from api.metrics import count_cache
+
+MISSING = object()
+LOCK_STRIPES = 64
+
+
+class LocalCache:
+    """
+    Least recently used values of one process, at most max_entries.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = value, time.monotonic() + timeout
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCache:
+    """
+    Values kept in the process in front of the shared Django cache.
+
+    Keys get the revisions of their namespaces, so touching a namespace
+    in api.revisions invalidates all its keys at once and in every
+    process; the old values are evicted by size and time. Only one
+    thread of the process and, through a lock key in the shared cache,
+    one process computes a missing value while the others wait for it.
+
+    Sharing between containers needs a shared cache with an atomic add,
+    memcached in docker-compose.production.yml. The default file cache
+    is local to its container and its add is not atomic, so there
+    processes may compute the same value at once.
+    """
+
+    def __init__(self, name, max_entries=None, timeout=None,
+                 local_timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.local = LocalCache(max_entries or settings.CACHE_L1_MAX_ENTRIES)
+        self.locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @property
+    def shared(self):
+        return caches[settings.TIERED_CACHE_ALIAS]
+
+    def make_key(self, key, namespaces=()):
+        versions = ':'.join(repr(revisions.get_revision(namespace))
+                            for namespace in namespaces)
+        return f'{self.name}:{key}:{versions}'
+
+    def lookup(self, key, count=True):
+        value = self.local.get(key)
+        if count:
+            count_cache(f'{self.name}_l1', value is not MISSING)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING)
+        if count:
+            count_cache(f'{self.name}_l2', value is not MISSING)
+        if value is not MISSING:
+            self.store_local(key, value)
+        return value
+
+    def store_local(self, key, value):
+        self.local.set(key, value,
+                       self.local_timeout or settings.CACHE_L1_TIMEOUT)
+
+    def store(self, key, value, timeout=None):
+        self.shared.set(key, value,
+                        timeout or self.timeout or settings.CACHE_TIMEOUT)
+        self.store_local(key, value)
+
+    def get(self, key, default=None, namespaces=()):
+        value = self.lookup(self.make_key(key, namespaces))
+        return default if value is MISSING else value
+
+    def set(self, key, value, timeout=None, namespaces=()):
+        self.store(self.make_key(key, namespaces), value, timeout)
+
+    def get_or_set(self, key, producer, timeout=None, namespaces=()):
+        """
+        Cached value of the key or the result of producer, cached.
+        """
+        key = self.make_key(key, namespaces)
+        value = self.lookup(key)
+        if value is not MISSING:
+            return value
+        with self.locks[zlib.crc32(key.encode()) % LOCK_STRIPES]:
+            value = self.lookup(key, count=False)
+            if value is MISSING:
+                value = self.fill(key, producer, timeout)
+            return value
+
+    def fill(self, key, producer, timeout):
+        """
+        Compute the value unless another process is computing it.
+
+        A process waits for the holder of the lock key at most
+        CACHE_LOCK_TIMEOUT seconds and then computes the value itself.
+        """
+        lock_key = f'lock:{key}'
+        locked = self.shared.add(lock_key, True, settings.CACHE_LOCK_TIMEOUT)
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+        while not locked and time.monotonic() < deadline:
+            time.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+            value = self.shared.get(key, MISSING)
+            if value is not MISSING:
+                self.store_local(key, value)
+                return value
+            locked = self.shared.add(lock_key, True,
+                                     settings.CACHE_LOCK_TIMEOUT)
+        try:
+            value = producer()
+            self.store(key, value, timeout)
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+        return value
+
+
+recipe_pages = TieredCache('recipe_pages')
+recipe_counts = TieredCache('recipe_counts')
+ingredient_lists = TieredCache('ingredient_lists')
+tag_maps = TieredCache('tag_maps', max_entries=4)
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import secrets
+from collections import defaultdict
+from functools import partial, wraps
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api import revisions
+from recipes.models import Recipe
+from users.models import Follow, User
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/api/recipes/events/'
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def notifications_supported():
+    """
+    Other processes are notified with NOTIFY only on PostgreSQL,
+    elsewhere only the connections of the current process get events.
+    """
+    return connection.vendor == 'postgresql'
+
+
+def make_payload(recipe_id, name, author_id):
+    return json.dumps({'id': recipe_id, 'name': name, 'author': author_id})
+
+
+def publish_recipes(recipes):
+    """
+    Announce new recipes to the readers following their authors.
+
+    On PostgreSQL one statement sends a NOTIFY per recipe; the database
+    delivers them when the transaction commits, so a rolled back recipe
+    is never announced.
+    """
+    payloads = [make_payload(recipe.pk, recipe.name, recipe.author_id)
+                for recipe in recipes]
+    if not payloads:
+        return
+    if notifications_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) '
+                'AS payload', [settings.SSE_CHANNEL, payloads])
+    else:
+        transaction.on_commit(partial(hub.publish_threadsafe, payloads))
+
+
+def open_listener():
+    listener = connection.Database.connect(
+        **connection.get_connection_params())
+    listener.autocommit = True
+    with listener.cursor() as cursor:
+        cursor.execute(
+            f'LISTEN {connection.ops.quote_name(settings.SSE_CHANNEL)}')
+    return listener
+
+
+class Hub:
+    """
+    Event streams of one process by the followed author.
+
+    On PostgreSQL one LISTEN connection per process, polled by the event
+    loop, receives the recipes of every process. A stream that does not
+    keep up loses its oldest events instead of blocking the others.
+    """
+
+    def __init__(self):
+        self.streams = defaultdict(set)
+        self.connections = 0
+        self.loop = None
+        self.listener = None
+
+    async def start(self):
+        if self.loop is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        if notifications_supported():
+            await self.listen()
+
+    async def listen(self):
+        while True:
+            try:
+                self.listener = await sync_to_async(
+                    open_listener, thread_sensitive=False)()
+            except connection.Database.Error:
+                logger.exception('Can not listen for new recipes.')
+                await asyncio.sleep(settings.SSE_RECONNECT_DELAY)
+                continue
+            self.loop.add_reader(self.listener, self.receive)
+            return
+
+    def receive(self):
+        try:
+            self.listener.poll()
+        except connection.Database.Error:
+            logger.exception('Lost the connection listening for recipes.')
+            self.loop.remove_reader(self.listener)
+            self.listener.close()
+            self.loop.create_task(self.listen())
+            return
+        payloads = [notify.payload for notify in self.listener.notifies]
+        self.listener.notifies.clear()
+        self.publish(payloads)
+
+    def subscribe(self, authors, queue):
+        for author in authors:
+            self.streams[author].add(queue)
+
+    def unsubscribe(self, authors, queue):
+        for author in authors:
+            queues = self.streams.get(author)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self.streams[author]
+
+    def publish(self, payloads):
+        for payload in payloads:
+            author = json.loads(payload)['author']
+            for queue in self.streams.get(author, ()):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(payload)
+
+    def publish_threadsafe(self, payloads):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.publish, payloads)
+
+
+hub = Hub()
+
+
+def format_event(payload):
+    return 'id: {}\nevent: recipe\ndata: {}\n\n'.format(
+        json.loads(payload)['id'], payload).encode()
+
+
+def ticket_key(ticket):
+    return f'sse-ticket:{ticket}'
+
+
+def issue_ticket(user):
+    """
+    Single-use key opening one event stream for SSE_TICKET_TIMEOUT
+    seconds. Browsers can not set headers of an EventSource, and a URL
+    with the token itself would leave it in access logs.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(ticket_key(ticket), user.pk, settings.SSE_TICKET_TIMEOUT)
+    return ticket
+
+
+def redeem_ticket(ticket):
+    """
+    User of the ticket; only the caller deleting the ticket gets it.
+    """
+    user_id = cache.get(ticket_key(ticket))
+    if user_id is None or not cache.delete(ticket_key(ticket)):
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def get_last_event_id(scope):
+    try:
+        return int(dict(scope['headers']).get(b'last-event-id', b''))
+    except ValueError:
+        return None
+
+
+def load_user(scope):
+    """
+    User of the Authorization header or of the ticket query parameter.
+    """
+    header = dict(scope['headers']).get(b'authorization', b'').decode()
+    keyword, _, key = header.partition(' ')
+    if keyword == 'Token' and key:
+        try:
+            return TokenAuthentication().authenticate_credentials(key)[0]
+        except AuthenticationFailed:
+            return None
+    query = parse_qs(scope.get('query_string', b'').decode())
+    ticket = query.get('ticket', [None])[0]
+    return ticket and redeem_ticket(ticket)
+
+
+def load_authors(user):
+    return set(Follow.objects.filter(
+        user=user).values_list('author_id', flat=True))
+
+
+def load_missed(authors, last_event_id):
+    """
+    Recipes published since the last event the client has seen.
+    """
+    recipes = Recipe.objects.filter(
+        author_id__in=authors, pk__gt=last_event_id,
+    ).order_by('pk').values_list('pk', 'name', 'author_id')
+    return [make_payload(*recipe)
+            for recipe in recipes[:settings.SSE_REPLAY_LIMIT]]
+
+
+def get_follows_revision(user):
+    return revisions.get_revision(revisions.FOLLOWS, user.pk)
+
+
+def database_sync_to_async(function):
+    """
+    sync_to_async for database work, closing broken and expired
+    connections before and after it as Django does around requests.
+    """
+    @wraps(function)
+    def wrapper(*args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+async def respond(send, status, text):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def recipe_events(scope, receive, send):
+    """
+    Stream of recipes published by the authors the user follows.
+
+    Every event carries the recipe id, name and author; the client loads
+    the recipe itself when it needs more. Comments are sent every
+    SSE_HEARTBEAT_INTERVAL seconds to keep proxies from closing the idle
+    connection, and the followed authors are reloaded when the user
+    subscribes or unsubscribes. A reconnecting client gets the recipes
+    it missed by the Last-Event-ID header. Browsers authenticate with a
+    ticket from /api/recipes/event_ticket/, a new one for every
+    connection.
+    """
+    if scope['method'] != 'GET':
+        await respond(send, 405, 'Method not allowed.')
+        return
+    user = await database_sync_to_async(load_user)(scope)
+    if not user:
+        await respond(send, 401, 'Authentication required.')
+        return
+    if hub.connections >= settings.SSE_MAX_CONNECTIONS:
+        await respond(send, 503, 'Too many connections.')
+        return
+    hub.connections += 1
+    queue = asyncio.Queue(settings.SSE_QUEUE_SIZE)
+    authors = set()
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await hub.start()
+        revision = await sync_to_async(get_follows_revision)(user)
+        authors = await database_sync_to_async(load_authors)(user)
+        hub.subscribe(authors, queue)
+        missed = []
+        last_event_id = get_last_event_id(scope)
+        if last_event_id is not None and authors:
+            missed = await database_sync_to_async(load_missed)(
+                authors, last_event_id)
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': STREAM_HEADERS})
+        await send({
+            'type': 'http.response.body', 'more_body': True,
+            'body': 'retry: {}\n\n'.format(
+                settings.SSE_RECONNECT_DELAY * 1000).encode() + b''.join(
+                format_event(payload) for payload in missed),
+        })
+        while True:
+            event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {event, disconnected}, timeout=settings.SSE_HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                event.cancel()
+                break
+            if event in done:
+                body = format_event(event.result())
+            else:
+                event.cancel()
+                body = b': ping\n\n'
+                current = await sync_to_async(get_follows_revision)(user)
+                if current != revision:
+                    revision = current
+                    hub.unsubscribe(authors, queue)
+                    authors = await database_sync_to_async(load_authors)(
+                        user)
+                    hub.subscribe(authors, queue)
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+    finally:
+        hub.unsubscribe(authors, queue)
+        hub.connections -= 1
+        disconnected.cancel()
@@ -1,6 +1,11 @@
 import django_filters
 from django_filters import FilterSet, filters, rest_framework
+
+from api import revisions
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_by_name
+
+INGREDIENT_SEARCH_LIMIT = 100
 
 
 class RecipeFilter(FilterSet):
@@ -14,10 +19,14 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),)
+    name = rest_framework.CharFilter(method='filter_name')
+    ordering = rest_framework.ChoiceFilter(choices=(('popular', 'popular'),),
+                                           method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags',)
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags',
+                  'name', 'ordering',)
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated:
@@ -29,6 +38,15 @@ class RecipeFilter(FilterSet):
             return queryset.filter(author__pk=int(value))
         return queryset
 
+    def filter_name(self, queryset, name, value):
+        return search_by_name(queryset, value, revision=revisions.get_revision(
+            revisions.RECIPES))
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by('-popularity', '-id')
+        return queryset
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated:
             return queryset.filter(shopping_list__user=self.request.user)
@@ -36,9 +54,12 @@ class RecipeFilter(FilterSet):
 
 
 class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name='name',
-                                     lookup_expr='istartswith')
+    name = django_filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name', )
+
+    def filter_name(self, queryset, name, value):
+        return search_by_name(queryset, value, revision=revisions.get_revision(
+            revisions.INGREDIENTS))
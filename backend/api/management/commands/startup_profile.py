@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BOOT = ('import django; django.setup(); '
+        'from foodgram_backend.warmup import warm_up; warm_up()')
+IMPORT_TIME = re.compile(r'import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)')
+MEMORY = re.compile(r'^(Rss|Pss):\s+(\d+) kB', re.MULTILINE)
+READY_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def read_memory(pid):
+    """
+    Resident and proportional set size of the process in kB.
+
+    Pss splits pages shared with other processes between them, so it
+    shows what copy-on-write sharing saves.
+    """
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        return {name.lower(): int(size)
+                for name, size in MEMORY.findall(file.read())}
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as file:
+        return [int(child) for child in file.read().split()]
+
+
+class Command(BaseCommand):
+    help = ('Measure import time per package, cold start of the '
+            'application and memory of gunicorn workers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Cold starts to time.')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Packages to show in the import profile.')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--skip-gunicorn', action='store_true',
+                            help='Do not measure worker memory.')
+        parser.add_argument('--json', help='Also write the report here.')
+        parser.add_argument('--max-cold-start', type=float,
+                            help='Fail when the median cold start in ms '
+                                 'is longer.')
+
+    def handle(self, *args, **options):
+        report = {
+            'imports': self.import_times(options['top']),
+            'cold_start': self.cold_start(options['runs']),
+        }
+        if not options['skip_gunicorn']:
+            report['memory'] = {
+                'preload': self.worker_memory(True, options['workers']),
+                'no_preload': self.worker_memory(False, options['workers']),
+            }
+        self.print_report(report)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        limit = options['max_cold_start']
+        if limit and report['cold_start']['median'] > limit:
+            raise CommandError(
+                f'Median cold start {report["cold_start"]["median"]:.0f} ms '
+                f'is longer than {limit:.0f} ms.')
+
+    def run_python(self, *args):
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, env=os.environ,
+            capture_output=True, text=True, check=True)
+
+    def import_times(self, top):
+        """
+        Own import time of the modules of every top-level package in ms.
+        """
+        result = self.run_python('-X', 'importtime', '-c', BOOT)
+        packages = Counter()
+        for own, module in IMPORT_TIME.findall(result.stderr):
+            packages[module.split('.')[0]] += int(own)
+        return {
+            'total': sum(packages.values()) / 1000,
+            'packages': {name: own / 1000
+                         for name, own in packages.most_common(top)},
+        }
+
+    def cold_start(self, runs):
+        """
+        Time from interpreter start to the warmed application in ms.
+        """
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            self.run_python('-c', BOOT)
+            times.append((time.perf_counter() - start) * 1000)
+        return {'min': min(times), 'median': statistics.median(times)}
+
+    def worker_memory(self, preload, workers):
+        """
+        Memory of a gunicorn master and its workers after some requests.
+        """
+        port = free_port()
+        env = dict(os.environ, GUNICORN_PRELOAD=str(preload))
+        master = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+             'foodgram_backend.wsgi'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.wait_ready(port, master)
+            for _ in range(workers * 5):
+                urlopen(f'http://127.0.0.1:{port}/api/tags/').read()
+            pids = children(master.pid)
+            memory = [read_memory(pid) for pid in pids]
+            return {
+                'master': read_memory(master.pid),
+                'workers': memory,
+                'worker_rss': statistics.mean(m['rss'] for m in memory),
+                'worker_pss': statistics.mean(m['pss'] for m in memory),
+            }
+        finally:
+            master.send_signal(signal.SIGTERM)
+            master.wait()
+
+    def wait_ready(self, port, master):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if master.poll() is not None:
+                raise CommandError('gunicorn exited on start.')
+            try:
+                urlopen(f'http://127.0.0.1:{port}/api/tags/').read()
+                return
+            except (URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError('gunicorn did not start in time.')
+
+    def print_report(self, report):
+        imports = report['imports']
+        self.stdout.write(f'Import time: {imports["total"]:.1f} ms')
+        for name, own in imports['packages'].items():
+            self.stdout.write(f'  {name:<30} {own:>8.1f} ms')
+        cold = report['cold_start']
+        self.stdout.write(f'Cold start: min {cold["min"]:.0f} ms, '
+                          f'median {cold["median"]:.0f} ms')
+        for mode, memory in report.get('memory', {}).items():
+            self.stdout.write(
+                f'{mode}: master RSS {memory["master"]["rss"]} kB, '
+                f'worker RSS {memory["worker_rss"]:.0f} kB, '
+                f'worker PSS {memory["worker_pss"]:.0f} kB')
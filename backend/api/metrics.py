@@ -0,0 +1,350 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                16777216)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+METRICS = {
+    'foodgram_http_request_duration_seconds': (
+        HISTOGRAM, 'Request latency by view and action.', LATENCY_BUCKETS),
+    'foodgram_db_queries_total': (
+        COUNTER, 'Database queries by view and action.', None),
+    'foodgram_db_query_duration_seconds_total': (
+        COUNTER, 'Time spent in database queries by view and action.', None),
+    'foodgram_cache_requests_total': (
+        COUNTER, 'Cache lookups by cache and result.', None),
+    'foodgram_shopping_list_bytes': (
+        HISTOGRAM, 'Size of exported shopping lists.', SIZE_BUCKETS),
+    'foodgram_image_upload_bytes': (
+        HISTOGRAM, 'Size of uploaded recipe images.', SIZE_BUCKETS),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+EXITED = 'exited.data'
+LOCK = 'lock'
+
+
+class Shard:
+    """
+    Metrics of one thread, changed without locks.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+
+class Registry:
+    """
+    Per-process metrics, flushed to a file of the shared directory.
+
+    Every thread writes to its own shard, so updates take no locks;
+    the flush reads all shards of the process. The /metrics view sums
+    the files of all gunicorn workers, including the ones that exited,
+    so counters never go back. Only the processes serving requests,
+    which set enabled, write files; management commands do not.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """
+        Start empty in a forked worker, the master's file is its own.
+        """
+        self.local = threading.local()
+        self.shards = []
+        self.path = None
+        self.flushed = 0
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = Shard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        self.shard().counters[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name, value, **labels):
+        histograms = self.shard().histograms
+        key = name, tuple(sorted(labels.items()))
+        buckets = METRICS[name][2]
+        if key not in histograms:
+            histograms[key] = [0] * (len(buckets) + 2)
+        histogram = histograms[key]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[index] += 1
+                break
+        else:
+            histogram[len(buckets)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        counters = defaultdict(float)
+        histograms = {}
+        for shard in list(self.shards):
+            for key, value in list(shard.counters.items()):
+                counters[key] += value
+            for key, values in list(shard.histograms.items()):
+                merge(histograms, key, values)
+        return [[COUNTER, name, labels, value]
+                for (name, labels), value in counters.items()] + [
+            [HISTOGRAM, name, labels, values]
+            for (name, labels), values in histograms.items()]
+
+    def flush(self, force=False):
+        """
+        Write the process snapshot at most once per flush interval.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        if self.path is None:
+            self.path = os.path.join(
+                settings.METRICS_DIR, f'{os.getpid()}-{uuid.uuid4().hex}.json')
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, self.path)
+
+
+def merge(histograms, key, values):
+    if key not in histograms:
+        histograms[key] = [0] * len(values)
+    histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+os.register_at_fork(after_in_child=registry.reset)
+
+
+def count_cache(cache, hit):
+    inc('foodgram_cache_requests_total', cache=cache,
+        result='hit' if hit else 'miss')
+
+
+@atexit.register
+def flush_on_exit():
+    if registry.shards:
+        registry.flush(force=True)
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_entries(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def add_entries(counters, histograms, entries):
+    for kind, metric, labels, value in entries:
+        key = metric, tuple(tuple(label) for label in labels)
+        if kind == COUNTER:
+            counters[key] += value
+        else:
+            merge(histograms, key, value)
+
+
+def fold_exited(names):
+    """
+    Archive of the snapshots of exited processes, with theirs added.
+
+    The snapshots are deleted after the archive is written; their names
+    stay in it until the files are gone, so a snapshot is never counted
+    twice even if deleting it fails.
+    """
+    path = os.path.join(settings.METRICS_DIR, EXITED)
+    archive = read_entries(path) or {'folded': [], 'entries': []}
+    folded = {name for name in archive['folded'] if name in names}
+    exited = [name for name in names if name not in folded
+              and not is_running(int(name.split('-')[0]))]
+    if not exited:
+        return archive
+    counters = defaultdict(float)
+    histograms = {}
+    add_entries(counters, histograms, archive['entries'])
+    for name in exited:
+        entries = read_entries(os.path.join(settings.METRICS_DIR, name))
+        if entries is not None:
+            add_entries(counters, histograms, entries)
+            folded.add(name)
+    archive = {
+        'folded': sorted(folded),
+        'entries': [[COUNTER, name, labels, value]
+                    for (name, labels), value in counters.items()] + [
+            [HISTOGRAM, name, labels, values]
+            for (name, labels), values in histograms.items()],
+    }
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(archive, file)
+    os.replace(temporary, path)
+    for name in folded:
+        try:
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+        except FileNotFoundError:
+            pass
+    return archive
+
+
+def collect():
+    """
+    Sum of the snapshots of all processes.
+
+    The snapshots of exited processes are folded into one archive under
+    a file lock, so their files do not pile up and concurrent scrapes
+    do not count them twice.
+    """
+    counters = defaultdict(float)
+    histograms = {}
+    if not os.path.isdir(settings.METRICS_DIR):
+        return counters, histograms
+    with open(os.path.join(settings.METRICS_DIR, LOCK), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        names = {name for name in os.listdir(settings.METRICS_DIR)
+                 if name.endswith('.json')}
+        archive = fold_exited(names)
+        add_entries(counters, histograms, archive['entries'])
+        for name in names.difference(archive['folded']):
+            entries = read_entries(os.path.join(settings.METRICS_DIR, name))
+            if entries is not None:
+                add_entries(counters, histograms, entries)
+    return counters, histograms
+
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"')) for name, value in labels) + '}'
+
+
+def render(counters, histograms):
+    """
+    Metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric, (kind, help_text, buckets) in METRICS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        if kind == COUNTER:
+            lines += [f'{metric}{format_labels(labels)} {value}'
+                      for (name, labels), value in sorted(counters.items())
+                      if name == metric]
+            continue
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = list(accumulate(values[:-1]))
+            for bound, count in zip(buckets + ('+Inf',), cumulative):
+                lines.append(f'{metric}_bucket'
+                             f'{format_labels(labels, [("le", bound)])} '
+                             f'{count}')
+            lines.append(f'{metric}_sum{format_labels(labels)} {values[-1]}')
+            lines.append(
+                f'{metric}_count{format_labels(labels)} {cumulative[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Metrics of all workers for Prometheus.
+
+    Only the allowed addresses or a request with the METRICS_TOKEN bearer
+    token see it, for everybody else the URL does not exist.
+    """
+    token = settings.METRICS_TOKEN
+    if not (request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+            or token and request.META.get(
+                'HTTP_AUTHORIZATION') == f'Bearer {token}'):
+        raise Http404
+    registry.flush(force=True)
+    return HttpResponse(render(*collect()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """
+    Times every request and counts its queries by DRF view and action.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_labels = {'view': 'unknown', 'action': 'unknown'}
+        queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        labels = request.metrics_labels
+        observe('foodgram_http_request_duration_seconds',
+                time.perf_counter() - start,
+                status=response.status_code, **labels)
+        inc('foodgram_db_queries_total', queries[0], **labels)
+        inc('foodgram_db_query_duration_seconds_total', queries[1],
+            **labels)
+        registry.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_labels = get_view_labels(view_func, request.method)
+
+
+def get_view_labels(view_func, method):
+    """
+    Name of the view class or function and of the DRF action.
+    """
+    view = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    return {
+        'view': view.__name__ if view else view_func.__name__,
+        'action': actions.get(method.lower(), method.lower()),
+    }
@@ -0,0 +1,64 @@
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination
+
+from api import revisions
+from api.caching import recipe_counts
+from foodgram_backend.pagination import EstimatedCountPaginator
+
+IGNORED_PARAMS = ('page', 'limit', 'fields', 'omit')
+
+
+class CachedCountPaginator(EstimatedCountPaginator):
+    """
+    Paginator which keeps the exact count of the queryset in the cache,
+    so concurrent requests of a new filter count it only once.
+    """
+
+    def __init__(self, *args, cache_key, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+
+    def exact_count(self):
+        return recipe_counts.get_or_set(
+            self.cache_key, super().exact_count, settings.COUNT_CACHE_TIMEOUT)
+
+
+class RecipePagination(PageNumberPagination):
+    """
+    Counts recipes once per filter signature and revision.
+
+    The signature is the normalized query without pagination and field
+    selection parameters.
+    User filters add the revision of the user's favorites or cart, so the
+    cached count changes with any recipe and with the user's own changes.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_key = self.get_count_key(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    @property
+    def django_paginator_class(self):
+        return partial(CachedCountPaginator, cache_key=self.count_key)
+
+    @staticmethod
+    def get_count_key(request):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if name not in IGNORED_PARAMS
+        )
+        parts = [params, revisions.get_revision(revisions.RECIPES)]
+        names = {name for name, _ in params}
+        user_id = request.user.pk
+        if 'is_favorited' in names:
+            parts += [user_id, revisions.get_revision(
+                revisions.FAVORITES, user_id)]
+        if 'is_in_shopping_cart' in names:
+            parts += [user_id, revisions.get_revision(
+                revisions.SHOPPING_CART, user_id)]
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return digest
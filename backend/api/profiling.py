@@ -0,0 +1,160 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+
+from django.conf import settings
+from django.contrib import admin
+from django.db import connection
+from django.http import Http404
+from django.shortcuts import render
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+REPORT_NAME = re.compile(r'^\d+$')
+TOP_FUNCTIONS = 40
+TOP_QUERIES = 20
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request of a staff user under cProfile on demand.
+
+    The request asks for it with the X-Profile header or the ?profile=1
+    parameter; every other request goes straight to the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (PROFILE_HEADER not in request.META
+                and PROFILE_PARAM not in request.META.get('QUERY_STRING', '')):
+            return self.get_response(request)
+        if not (PROFILE_HEADER in request.META
+                or PROFILE_PARAM in request.GET) or not is_staff(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def profile(self, request):
+        queries = []
+
+        def log_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((time.perf_counter() - start, sql))
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(log_query):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+        response['X-Profile-Id'] = save_report(
+            request, response, profiler, queries, duration)
+        return response
+
+
+def is_staff(request):
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        result = TokenAuthentication().authenticate(Request(request))
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def save_report(request, response, profiler, queries, duration):
+    """
+    Write the report and drop the oldest ones beyond PROFILE_MAX_REPORTS.
+    """
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+    name = str(time.time_ns())
+    stats_output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stats_output)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    lines = [
+        f'{request.method} {request.get_full_path()}',
+        f'Status: {response.status_code}',
+        f'Time: {duration * 1000:.1f} ms',
+        f'SQL: {len(queries)} queries, '
+        f'{sum(spent for spent, _ in queries) * 1000:.1f} ms',
+        '',
+        'Slowest queries:',
+    ]
+    for spent, sql in sorted(queries, reverse=True)[:TOP_QUERIES]:
+        lines.append(f'{spent * 1000:8.1f} ms  {sql}')
+    lines.extend(('', stats_output.getvalue()))
+    path = os.path.join(settings.PROFILE_ROOT, name)
+    with open(f'{path}.txt', 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines))
+    stats.dump_stats(f'{path}.prof')
+    for old in list_reports()[settings.PROFILE_MAX_REPORTS:]:
+        for extension in ('.txt', '.prof'):
+            try:
+                os.remove(os.path.join(settings.PROFILE_ROOT,
+                                       old + extension))
+            except FileNotFoundError:
+                pass
+    return name
+
+
+def list_reports():
+    """
+    Names of saved reports, newest first.
+    """
+    if not os.path.isdir(settings.PROFILE_ROOT):
+        return []
+    return sorted((file_name[:-4]
+                   for file_name in os.listdir(settings.PROFILE_ROOT)
+                   if file_name.endswith('.txt')),
+                  key=int, reverse=True)
+
+
+def read_summary(name):
+    with open(os.path.join(settings.PROFILE_ROOT, f'{name}.txt'),
+              encoding='utf-8') as file:
+        return file.read()
+
+
+@admin.site.admin_view
+def profile_list(request):
+    reports = []
+    for name in list_reports():
+        try:
+            summary = read_summary(name).splitlines()
+        except FileNotFoundError:
+            continue
+        reports.append({'name': name, 'request': summary[0],
+                        'details': ', '.join(summary[1:4])})
+    return render(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'reports': reports,
+    })
+
+
+@admin.site.admin_view
+def profile_detail(request, name):
+    if not REPORT_NAME.match(name):
+        raise Http404
+    try:
+        summary = read_summary(name)
+    except FileNotFoundError:
+        raise Http404
+    return render(request, 'admin/profile_detail.html', {
+        **admin.site.each_context(request),
+        'title': f'Request profile {name}',
+        'summary': summary,
+    })
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+from api.metrics import get_view_labels
+
+QUERY_CANCELED = '57014'
+EXPLAINABLE = ('SELECT', 'WITH')
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+logger = logging.getLogger(__name__)
+
+
+class ExplainSample:
+    """
+    Decides which slow queries get their plan logged.
+
+    A plan is taken once per query text and interval, and at most
+    SLOW_QUERY_EXPLAIN_LIMIT texts are remembered, so a hot slow query
+    does not run EXPLAIN on every request.
+    """
+
+    def __init__(self):
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, sql):
+        key = hashlib.sha1(sql.encode()).hexdigest()
+        now = time.monotonic()
+        with self.lock:
+            last = self.seen.get(key)
+            if last is not None and (
+                    now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL):
+                return False
+            self.seen[key] = now
+            self.seen.move_to_end(key)
+            while len(self.seen) > settings.SLOW_QUERY_EXPLAIN_LIMIT:
+                self.seen.popitem(last=False)
+        return True
+
+
+sample = ExplainSample()
+
+
+@receiver(connection_created)
+def forget_statement_timeout(sender, connection, **kwargs):
+    connection.statement_timeout = None
+
+
+def get_statement_timeout(view):
+    return settings.STATEMENT_TIMEOUTS.get(view, settings.STATEMENT_TIMEOUT)
+
+
+def explain(sql, params):
+    """
+    Plan of the query, taken on a separate cursor of the same connection.
+    """
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return '\n'.join(
+            ' '.join(str(column) for column in row)
+            for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+class QueryLogMiddleware:
+    """
+    Logs slow queries with their view and applies statement timeouts.
+
+    Queries slower than SLOW_QUERY_THRESHOLD seconds are logged with a
+    sampled EXPLAIN. On PostgreSQL the first query of a request sets
+    statement_timeout from STATEMENT_TIMEOUTS by "View.action", or
+    STATEMENT_TIMEOUT before the view is resolved, and a cancelled query
+    turns into 503 instead of holding the worker.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_view = 'unknown'
+        connection.wanted_statement_timeout = settings.STATEMENT_TIMEOUT
+        with connection.execute_wrapper(self.log_query(request)):
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        labels = get_view_labels(view_func, request.method)
+        request.query_view = '{view}.{action}'.format(**labels)
+        connection.wanted_statement_timeout = get_statement_timeout(
+            request.query_view)
+
+    def process_exception(self, request, exception):
+        if (isinstance(exception, OperationalError) and getattr(
+                exception.__cause__, 'pgcode', None) == QUERY_CANCELED):
+            logger.warning('Statement timeout in %s', request.query_view)
+            return JsonResponse({'errors': 'The request took too long.'},
+                                status=503)
+        return None
+
+    def log_query(self, request):
+        def wrapper(execute, sql, params, many, context):
+            if (connection.vendor == 'postgresql'
+                    and not sql.startswith(TRANSACTION_CONTROL)):
+                self.apply_timeout(context['cursor'])
+            start = time.perf_counter()
+            result = execute(sql, params, many, context)
+            duration = time.perf_counter() - start
+            if duration >= settings.SLOW_QUERY_THRESHOLD:
+                self.log_slow(request, sql, params, many, duration)
+            return result
+        return wrapper
+
+    def apply_timeout(self, cursor):
+        """
+        Set the timeout for the session, or only for the transaction
+        inside one, because a rollback would undo a session SET unnoticed.
+        """
+        wanted = getattr(connection, 'wanted_statement_timeout', None)
+        if wanted is None or getattr(
+                connection, 'statement_timeout', None) == wanted:
+            return
+        if connection.in_atomic_block:
+            cursor.cursor.execute('SET LOCAL statement_timeout = %s',
+                                  [wanted])
+            return
+        cursor.cursor.execute('SET statement_timeout = %s', [wanted])
+        connection.statement_timeout = wanted
+
+    def log_slow(self, request, sql, params, many, duration):
+        logger.warning('Slow query %.3f s in %s: %s',
+                       duration, request.query_view, sql)
+        if (many or not sql.lstrip().upper().startswith(EXPLAINABLE)
+                or not sample.take(sql)):
+            return
+        try:
+            plan = explain(sql, params)
+        except Exception:
+            logger.exception('Could not explain the query')
+            return
+        logger.warning('Plan of the slow query in %s:\n%s',
+                       request.query_view, plan)
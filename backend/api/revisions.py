@@ -0,0 +1,64 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+from api.metrics import count_cache
+
+RECIPES = 'recipes'
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+FOLLOWS = 'follows'
+USERS = 'users'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+USER_NAMESPACES = (FAVORITES, SHOPPING_CART, FOLLOWS)
+
+
+def revision_key(namespace, user_id=None):
+    if user_id is None:
+        return f'revision:{namespace}'
+    return f'revision:{namespace}:{user_id}'
+
+
+def get_revision(namespace, user_id=None):
+    """
+    Time of the last change in the namespace, kept in the shared cache.
+
+    A namespace missing from the cache gets the current time, so a lost
+    revision can never repeat an older one.
+    """
+    key = revision_key(namespace, user_id)
+    revision = cache.get(key)
+    count_cache('revisions', revision is not None)
+    if revision is None:
+        cache.add(key, time.time(), None)
+        revision = cache.get(key)
+    return revision
+
+
+def touch(namespace, user_id=None):
+    """
+    Move the revision of the namespace once the transaction commits.
+
+    A request reading the new revision before the commit would count or
+    render the old data and cache it under the new revision.
+    """
+    transaction.on_commit(partial(bump, namespace, user_id))
+
+
+def bump(namespace, user_id=None):
+    key = revision_key(namespace, user_id)
+    cache.set(key, max(time.time(), (cache.get(key) or 0) + 1e-6), None)
+
+
+def get_revisions(namespaces, user=None):
+    """
+    Revisions of the shared namespaces and of the user's own ones.
+    """
+    result = [get_revision(namespace) for namespace in namespaces]
+    if user is not None and user.is_authenticated:
+        result.extend(get_revision(namespace, user.pk)
+                      for namespace in USER_NAMESPACES)
+    return result
@@ -1,22 +1,62 @@
 import base64
+import binascii
+import json
 from datetime import datetime
 
 from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.http import QueryDict
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.generics import get_object_or_404
 
+from api.metrics import observe
+from api.uploads import check_image, detect_image_type
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                             ShoppingCart, Tag)
+from recipes.tasks import update_signature
 from users.models import Follow, User
 
 MINIMUM_QUANTITY = 1
 MAXIMUM_QUANTITY = 32000
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_subscriptions(request):
+    """
+    Ids of authors followed by the current user, loaded once per request.
+    """
+    if not hasattr(request, '_subscriptions'):
+        request._subscriptions = set(Follow.objects.filter(
+            user=request.user).values_list('author_id', flat=True))
+    return request._subscriptions
+
+
+class SparseFieldsMixin:
+    """
+    Serializer that leaves only the fields passed in the fields argument.
+
+    Fields computed in to_representation are listed in extra_fields.
+    """
+    extra_fields = ()
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def output_field_names(self):
+        return [field.field_name for field in self._readable_fields] + list(
+            self.extra_fields)
+
+    def wants(self, name):
+        return self.sparse_fields is None or name in self.sparse_fields
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    extra_fields = ('is_subscribed',)
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -36,12 +76,13 @@ class UserSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super(UserSerializer, self).to_representation(instance)
         request = self.context.get('request')
-        if request and request.method == 'GET':
-            if self.context['request'].user.is_authenticated:
-                data['is_subscribed'] = Follow.objects.filter(
-                    user=self.context['request'].user,
-                    author=instance
-                ).exists()
+        if request and request.method == 'GET' and self.wants(
+                'is_subscribed'):
+            if hasattr(instance, 'is_subscribed'):
+                data['is_subscribed'] = instance.is_subscribed
+            elif request.user.is_authenticated:
+                data['is_subscribed'] = (
+                    instance.pk in get_subscriptions(request))
             else:
                 data['is_subscribed'] = False
         else:
@@ -96,8 +137,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 class IngredientRecipeShortSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(required=True,
-                                            queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(required=True, min_value=1)
     amount = serializers.IntegerField(
         validators=(MinValueValidator(MINIMUM_QUANTITY),
                     MaxValueValidator(MAXIMUM_QUANTITY))
@@ -140,6 +180,9 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'recipes_count')
 
     def get_recipes(self, instance):
+        """
+        Recipes of the author, sliced from the prefetched ones.
+        """
         recipes = instance.recipes.all()
         recipes_limit = self.context['request'].query_params.get(
             'recipes_limit'
@@ -149,30 +192,12 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return LittleRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, instance):
+        if hasattr(instance, 'recipes_count'):
+            return instance.recipes_count
         return instance.recipes.all().count()
 
-    def validate(self, attrs):
-        author = get_object_or_404(User, id=self.initial_data['id'])
-        subscribe = Follow.objects.filter(
-            author=author, user=self.context['request'].user)
-        if self.context['method'] == 'POST':
-            if author == self.context['request'].user:
-                raise ValidationError('You don\'t subscribe to yourself.')
-            if subscribe.exists():
-                raise ValidationError('Already exist subscribe.')
-        else:
-            if not subscribe.exists():
-                raise ValidationError('Subscribe not exist.')
-        return attrs
 
-    def create(self, validated_data):
-        subscribe = Follow.objects.create(
-            author_id=self.initial_data['id'],
-            user=self.context['request'].user)
-        return subscribe.author
-
-
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
@@ -195,13 +220,15 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_ingredients(self, instance):
         return IngredientInRecipeSerializer(
-            IngredientInRecipe.objects.filter(recipe=instance),
+            instance.ingridientinrecipe.all(),
             many=True
         ).data
 
     def get_is_favorited(self, instance):
         if not self.context['request'].user.is_authenticated:
             return False
+        if hasattr(instance, 'is_favorited'):
+            return instance.is_favorited
         return Favorite.objects.filter(
             recipe=instance, user=self.context['request'].user
         ).exists()
@@ -209,77 +236,45 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_is_in_shopping_cart(self, instance):
         if not self.context['request'].user.is_authenticated:
             return False
+        if hasattr(instance, 'is_in_shopping_cart'):
+            return instance.is_in_shopping_cart
         return ShoppingCart.objects.filter(
             recipe=instance, user=self.context['request'].user
         ).exists()
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    name = serializers.CharField(read_only=True)
-    cooking_time = serializers.IntegerField(read_only=True)
-    image = serializers.ImageField(read_only=True)
-
-    class Meta:
-        model = Recipe
-        fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time')
-
-    def validate(self, attrs):
-        recipe = get_object_or_404(Recipe, id=self.initial_data['id'])
-        favorite = Favorite.objects.filter(
-            recipe=recipe, user=self.context['request'].user)
-        if self.context['method'] == 'POST':
-            if favorite.exists():
-                raise ValidationError('Already in favorite.')
-        else:
-            if not favorite.exists():
-                raise ValidationError('Recipe not in favorite.')
-        return attrs
-
-    def create(self, validated_data):
-        favorite = Favorite.objects.create(
-            recipe_id=self.initial_data['id'],
-            user=self.context['request'].user)
-        return favorite.recipe
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    name = serializers.CharField(read_only=True)
-    cooking_time = serializers.IntegerField(read_only=True)
-    image = serializers.ImageField(read_only=True)
-
-    class Meta:
-        model = Recipe
-        fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time')
-
-    def validate(self, attrs):
-        recipe = get_object_or_404(Recipe, id=self.initial_data['id'])
-        shopping_list = ShoppingCart.objects.filter(
-            recipe=recipe, user=self.context['request'].user)
-        if self.context['method'] == 'POST':
-            if shopping_list.exists():
-                raise ValidationError('Recipe already in list.')
-        else:
-            if not shopping_list.exists():
-                raise ValidationError('Recipe not in list.')
-        return attrs
+class RecipeImageField(serializers.Field):
+    """
+    Image given either as a multipart upload or as a base64 data URI.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            check_image(data.content_type, data.size)
+            observe('foodgram_image_upload_bytes', data.size)
+            return data
+        if not isinstance(data, str) or ';base64,' not in data:
+            raise ValidationError('Need an image file or a base64 data URI.')
+        type_image, image = data.split(';base64,')
+        check_image(type_image.replace('data:', ''), len(image) * 3 // 4)
+        try:
+            content = base64.b64decode(image)
+        except binascii.Error:
+            raise ValidationError('Invalid base64 image.')
+        check_image(detect_image_type(content[:16]), len(content))
+        observe('foodgram_image_upload_bytes', len(content))
+        name = datetime.now().strftime("%Y%m%d%H%M%S")
+        return ContentFile(
+            content,
+            name=f"{name}.{type_image.split('/')[-1]}"
+        )
 
-    def create(self, validated_data):
-        shopping_list = ShoppingCart.objects.create(
-            recipe_id=self.initial_data['id'],
-            user=self.context['request'].user)
-        return shopping_list.recipe
+    def to_representation(self, value):
+        return value.url if value else None
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
-    image = serializers.CharField(required=False)
+    image = RecipeImageField(required=False)
     name = serializers.CharField(required=True)
     text = serializers.CharField(required=True)
     cooking_time = serializers.IntegerField(
@@ -288,8 +283,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                     MaxValueValidator(MAXIMUM_QUANTITY))
     )
     ingredients = IngredientRecipeShortSerializer(required=True, many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        required=True, many=True, queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        required=True, child=serializers.IntegerField(min_value=1)
     )
 
     class Meta:
@@ -302,66 +297,135 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time')
 
-    def convert_base64_to_image(self):
-        type_image, image = self.validated_data['image'].split(';base64,')
-        name = datetime.now().strftime("%Y%m%d%H%M%S")
-        return ContentFile(
-            base64.b64decode(image),
-            name=f"{name}.{type_image.split('/')[-1]}"
-        )
-
-    def validate(self, data):
-        ingredients_pk = [obj['id'] for obj in
-                          self.initial_data['ingredients']]
-        if len(ingredients_pk) > len(set(ingredients_pk)):
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = self.parse_multipart(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def parse_multipart(data):
+        """
+        Multipart forms send ingredients as a JSON string and tags either
+        as a JSON string or as repeated fields.
+        """
+        parsed = data.dict()
+        for name in ('ingredients', 'tags'):
+            values = data.getlist(name)
+            if len(values) == 1 and values[0].lstrip().startswith('['):
+                try:
+                    parsed[name] = json.loads(values[0])
+                except ValueError:
+                    raise ValidationError({name: 'Invalid JSON.'})
+            elif values:
+                parsed[name] = values
+        return parsed
+
+    @staticmethod
+    def resolve(model, ids, known=None):
+        """
+        Objects by the given ids, found with one query for all of them.
+
+        known is a map of already loaded objects by id, shared by the
+        items of a batch.
+        """
+        if known is None:
+            known = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in known]
+        if missing:
+            raise ValidationError('{} not found: {}.'.format(
+                model._meta.verbose_name_plural.capitalize(),
+                ', '.join(map(str, missing))))
+        return [known[pk] for pk in ids]
+
+    def validate_ingredients(self, value):
+        ids = [item['id'] for item in value]
+        if len(ids) > len(set(ids)):
             raise ValidationError('Need unique ingredients.')
-        if len(self.initial_data['tags']) > len(
-                set(self.initial_data['tags'])):
+        ingredients = self.resolve(
+            Ingredient, ids, self.context.get('ingredient_map'))
+        for item, ingredient in zip(value, ingredients):
+            item['ingredient'] = ingredient
+        return value
+
+    def validate_tags(self, value):
+        if len(value) > len(set(value)):
             raise ValidationError('Need unique tags.')
+        return self.resolve(Tag, value, self.context.get('tag_map'))
+
+    def validate(self, data):
+        if self.instance is None and not data.get('image'):
+            raise ValidationError({'image': 'This field is required.'})
         return data
 
+    def check_duplicate(self, instance=None):
+        content_hash = Recipe.make_content_hash(
+            self.validated_data['name'],
+            self.validated_data['text'],
+            self.validated_data['cooking_time'])
+        duplicates = Recipe.objects.filter(content_hash=content_hash)
+        if instance is not None:
+            if content_hash == instance.make_content_hash(
+                    instance.name, instance.text, instance.cooking_time):
+                return
+            duplicates = duplicates.exclude(pk=instance.pk)
+        if duplicates.exists():
+            raise ValidationError('Recipe already exist.')
+
     def create(self, validated_data):
-        recipe = Recipe.objects.filter(
+        self.check_duplicate()
+        obj = Recipe(
             name=self.validated_data['name'],
+            image=self.validated_data['image'],
             text=self.validated_data['text'],
             cooking_time=self.validated_data['cooking_time'],
-        ).exists()
-        if recipe:
+            author=self.context['request'].user
+        )
+        try:
+            with transaction.atomic():
+                obj.save()
+                ingredients = [IngredientInRecipe(
+                    ingredient=item['ingredient'],
+                    recipe=obj,
+                    amount=item['amount']
+                ) for item in self.validated_data['ingredients']]
+                IngredientInRecipe.objects.bulk_create(ingredients)
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe=obj, tag=tag)
+                    for tag in self.validated_data['tags'])
+                update_signature.enqueue(
+                    obj.pk, dedup_key=f'recipe-signature:{obj.pk}')
+        except IntegrityError as error:
+            obj.image.delete(save=False)
+            if not Recipe.is_duplicate_error(error):
+                raise
             raise ValidationError('Recipe already exist.')
-        with transaction.atomic():
-            obj = Recipe(
-                name=self.validated_data['name'],
-                image=self.convert_base64_to_image(),
-                text=self.validated_data['text'],
-                cooking_time=self.validated_data['cooking_time'],
-                author=self.context['request'].user
-            )
-            obj.save()
-            ingredients = [IngredientInRecipe(
-                ingredient=item['id'],
-                recipe=obj,
-                amount=item['amount']
-            ) for item in self.validated_data['ingredients']]
-            IngredientInRecipe.objects.bulk_create(ingredients)
-            obj.tags.set(self.validated_data['tags'])
-            return obj
+        return obj
 
     def update(self, instance, validated_data):
-        with transaction.atomic():
-            instance.name = self.validated_data['name']
-            instance.text = self.validated_data['text']
-            instance.cooking_time = self.validated_data['cooking_time']
-            if self.validated_data.get('image'):
-                instance.image = self.convert_base64_to_image()
-            instance.tags.set(self.validated_data['tags'])
-            instance.save()
-            ingr = IngredientInRecipe.objects.filter(recipe=instance)
-            for ingredient in ingr:
-                ingredient.delete()
-            ingredients = [IngredientInRecipe(
-                ingredient=item['id'],
-                recipe=instance,
-                amount=item['amount']
-            ) for item in self.validated_data['ingredients']]
-            IngredientInRecipe.objects.bulk_create(ingredients)
-            return instance
+        self.check_duplicate(instance)
+        image = instance.image.name
+        try:
+            with transaction.atomic():
+                instance.name = self.validated_data['name']
+                instance.text = self.validated_data['text']
+                instance.cooking_time = self.validated_data['cooking_time']
+                if self.validated_data.get('image'):
+                    instance.image = self.validated_data['image']
+                instance.tags.set(self.validated_data['tags'])
+                instance.save()
+                IngredientInRecipe.objects.filter(recipe=instance).delete()
+                ingredients = [IngredientInRecipe(
+                    ingredient=item['ingredient'],
+                    recipe=instance,
+                    amount=item['amount']
+                ) for item in self.validated_data['ingredients']]
+                IngredientInRecipe.objects.bulk_create(ingredients)
+                update_signature.enqueue(
+                    instance.pk, dedup_key=f'recipe-signature:{instance.pk}')
+        except IntegrityError as error:
+            if instance.image.name != image:
+                instance.image.delete(save=False)
+            if not Recipe.is_duplicate_error(error):
+                raise
+            raise ValidationError('Recipe already exist.')
+        return instance
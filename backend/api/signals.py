@@ -0,0 +1,84 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api import events, revisions
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.signals import (ingredients_created, popularity_updated,
+                             recipes_created, recipes_deleted, users_deleted)
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(recipes_created)
+@receiver(recipes_deleted)
+@receiver(popularity_updated)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(sender, **kwargs):
+    revisions.touch(revisions.RECIPES)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        events.publish_recipes([instance])
+
+
+@receiver(recipes_created)
+def recipes_created_in_bulk(sender, recipes, **kwargs):
+    events.publish_recipes(recipes)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, **kwargs):
+    revisions.touch(revisions.FAVORITES, instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    revisions.touch(revisions.SHOPPING_CART, instance.user_id)
+
+
+@receiver(recipes_deleted)
+def user_lists_lost_recipes(sender, favorite_users=(), cart_users=(),
+                            **kwargs):
+    for user_id in favorite_users:
+        revisions.touch(revisions.FAVORITES, user_id)
+    for user_id in cart_users:
+        revisions.touch(revisions.SHOPPING_CART, user_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    revisions.touch(revisions.FOLLOWS, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(users_deleted)
+def user_changed(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    revisions.touch(revisions.USERS)
+
+
+@receiver(users_deleted)
+def followed_authors_deleted(sender, followers=(), **kwargs):
+    for user_id in followers:
+        revisions.touch(revisions.FOLLOWS, user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    revisions.touch(revisions.TAGS)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(ingredients_created)
+def ingredient_changed(sender, **kwargs):
+    revisions.touch(revisions.INGREDIENTS)
@@ -0,0 +1,120 @@
+import base64
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone as django_timezone
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipe, RecipeTombstone
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+UPDATED = 0
+DELETED = 1
+START = (EPOCH, DELETED, 0)
+
+
+def encode_cursor(moment, kind, pk):
+    microseconds = (moment - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(
+        json.dumps([microseconds, kind, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return START
+    try:
+        microseconds, kind, pk = json.loads(base64.urlsafe_b64decode(cursor))
+        return EPOCH + timedelta(microseconds=microseconds), kind, pk
+    except (ValueError, TypeError):
+        raise ValidationError({'since': 'Invalid cursor.'})
+
+
+def after(cursor, time_field, id_field, kind):
+    """
+    Rows whose (time, kind, id) position is past the cursor.
+    """
+    moment, cursor_kind, pk = cursor
+    condition = Q(**{f'{time_field}__gt': moment})
+    if kind > cursor_kind:
+        condition |= Q(**{time_field: moment})
+    elif kind == cursor_kind:
+        condition |= Q(**{time_field: moment, f'{id_field}__gt': pk})
+    return condition
+
+
+def get_horizon():
+    """
+    Moment up to which no change can appear anymore.
+
+    updated_at and deleted_at are set before the writing transaction
+    commits, so a change may become visible with a time behind a cursor
+    already returned. Changes are served only up to the start of the
+    oldest running transaction that has written on PostgreSQL, less
+    SYNC_CLOCK_MARGIN for clocks of the app servers running behind the
+    database. A transaction running longer than SYNC_MAX_LAG seconds
+    holds the horizon back no further, so it can not stop the feed.
+    """
+    now = django_timezone.now()
+    horizon = now
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT min(xact_start) FROM pg_stat_activity "
+                "WHERE datname = current_database() "
+                "AND backend_type = 'client backend' "
+                "AND state <> 'idle' AND backend_xid IS NOT NULL "
+                "AND pid <> pg_backend_pid()")
+            oldest = cursor.fetchone()[0]
+        if oldest is not None:
+            horizon = min(horizon, oldest)
+        limit = now - timedelta(seconds=settings.SYNC_MAX_LAG)
+        if horizon < limit:
+            logger.warning('A transaction started at %s holds back the '
+                           'change feed, serving changes up to %s.',
+                           horizon, limit)
+            horizon = limit
+    return horizon - timedelta(seconds=settings.SYNC_CLOCK_MARGIN)
+
+
+def get_changes(cursor, limit, recipes=None):
+    """
+    Up to limit recipes updated and ids deleted after the cursor.
+
+    Updates and deletions form one stream ordered by time, kind and id,
+    the returned cursor points at the last change of the batch.
+    """
+    cursor = decode_cursor(cursor)
+    horizon = get_horizon()
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    updated = recipes.filter(
+        after(cursor, 'updated_at', 'id', UPDATED),
+        updated_at__lte=horizon,
+    ).order_by('updated_at', 'id')[:limit + 1]
+    deleted = RecipeTombstone.objects.filter(
+        after(cursor, 'deleted_at', 'recipe_id', DELETED),
+        deleted_at__lte=horizon,
+    ).order_by('deleted_at', 'recipe_id').values_list(
+        'deleted_at', 'recipe_id')[:limit + 1]
+    changes = sorted(
+        [(recipe.updated_at, UPDATED, recipe.pk, recipe)
+         for recipe in updated]
+        + [(moment, DELETED, pk, None) for moment, pk in deleted],
+        key=lambda change: change[:3]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    next_cursor = (encode_cursor(*changes[-1][:3]) if changes
+                   else encode_cursor(*cursor))
+    return {
+        'updated': [recipe for *_, recipe in changes if recipe is not None],
+        'deleted': [pk for _, kind, pk, _ in changes if kind == DELETED],
+        'next': next_cursor,
+        'has_more': has_more,
+    }
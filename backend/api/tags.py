@@ -0,0 +1,17 @@
+from api import revisions
+from api.caching import tag_maps
+from recipes.models import Tag
+
+
+def load_tag_map():
+    return {tag.slug: tag for tag in Tag.objects.all()}
+
+
+def get_tag_map():
+    """
+    Tags by slug, kept in the tiered cache until any tag changes.
+
+    gunicorn loads the map in the master, so workers start with it.
+    """
+    return tag_maps.get_or_set('all', load_tag_map,
+                               namespaces=(revisions.TAGS,))
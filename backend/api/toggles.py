@@ -0,0 +1,79 @@
+from django.db import connection
+
+from recipes.models import Recipe
+
+RECIPE_CARD_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def add_relation(model, user_id, field, target_id):
+    """
+    Link the user to the target unless the link already exists.
+
+    One INSERT ... SELECT statement checks that the target exists and
+    skips duplicates, so double clicks can not create two rows or fail
+    on the unique constraint. Returns True when a row was inserted.
+    """
+    quote = connection.ops.quote_name
+    target_field = model._meta.get_field(field)
+    target = target_field.related_model._meta
+    sql = (
+        'INSERT INTO {table} ({user}, {column}) '
+        'SELECT %s, {pk} FROM {target} WHERE {pk} = %s '
+        'ON CONFLICT DO NOTHING RETURNING {column}'
+    ).format(
+        table=quote(model._meta.db_table),
+        user=quote(model._meta.get_field('user').column),
+        column=quote(target_field.column),
+        target=quote(target.db_table),
+        pk=quote(target.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, target_id])
+        return cursor.fetchone() is not None
+
+
+def remove_relation(model, user_id, field, target_id):
+    """
+    Delete the link of the user to the target in one statement.
+
+    Returns True when the link existed.
+    """
+    quote = connection.ops.quote_name
+    column = quote(model._meta.get_field(field).column)
+    sql = (
+        'DELETE FROM {table} WHERE {user} = %s AND {column} = %s '
+        'RETURNING {column}'
+    ).format(
+        table=quote(model._meta.db_table),
+        user=quote(model._meta.get_field('user').column),
+        column=column,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, target_id])
+        return cursor.fetchone() is not None
+
+
+def mark_recipe_stale(recipe_id):
+    """
+    Flag the recipe for the popularity update and load its short card.
+
+    The UPDATE returns the card fields, so no separate SELECT is needed.
+    Returns None when the recipe does not exist.
+    """
+    quote = connection.ops.quote_name
+    sql = (
+        'UPDATE {table} SET {stale} = %s WHERE {pk} = %s RETURNING {fields}'
+    ).format(
+        table=quote(Recipe._meta.db_table),
+        stale=quote(Recipe._meta.get_field('popularity_stale').column),
+        pk=quote(Recipe._meta.pk.column),
+        fields=', '.join(
+            quote(Recipe._meta.get_field(name).column)
+            for name in RECIPE_CARD_FIELDS),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [True, recipe_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return Recipe(**dict(zip(RECIPE_CARD_FIELDS, row)))
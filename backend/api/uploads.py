@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.files.uploadhandler import (FileUploadHandler,
+                                             TemporaryFileUploadHandler)
+from rest_framework.exceptions import ValidationError
+
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def detect_image_type(header):
+    """
+    Content type of an image by the magic bytes of its first chunk.
+    """
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def check_image(content_type, size=None):
+    if content_type not in settings.RECIPE_IMAGE_CONTENT_TYPES:
+        raise ValidationError('Unsupported image type.')
+    if size is not None and size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValidationError('Image is too large.')
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """
+    Validates uploaded images while the body is streamed.
+
+    The handler does not store anything itself: it rejects the request
+    by Content-Length, declared type, magic bytes and size as soon as
+    each of them is known and passes the chunks on to the next handler.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = (settings.RECIPE_IMAGE_MAX_SIZE
+                 + settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+        if content_length and content_length > limit:
+            raise ValidationError({'image': ['Image is too large.']})
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.field_name == 'image':
+            self.check(self.content_type)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.field_name != 'image':
+            return raw_data
+        try:
+            if start == 0:
+                self.check(detect_image_type(raw_data))
+            self.check(self.content_type, start + len(raw_data))
+        except ValidationError:
+            self.discard_upload()
+            raise
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def discard_upload(self):
+        """
+        Remove the temporary file the next handler has already opened.
+
+        Django cleans up the handlers only when an upload is stopped with
+        StopUpload, not when a handler raises.
+        """
+        for handler in self.request.upload_handlers:
+            handler.upload_interrupted()
+
+    @staticmethod
+    def check(content_type, size=None):
+        try:
+            check_image(content_type, size)
+        except ValidationError as error:
+            raise ValidationError({'image': error.detail})
+
+
+def get_image_upload_handlers(request):
+    return [RecipeImageUploadHandler(request),
+            TemporaryFileUploadHandler(request)]
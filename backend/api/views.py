@@ -1,28 +1,113 @@
 
-from django.db.models import Sum
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Prefetch, Sum
 from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
 from django_filters import rest_framework
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import IngredientFilter, RecipeFilter
+from api import events, revisions
+from api.bulk import create_recipes
+from api.caching import ingredient_lists, recipe_pages
+from api.filters import INGREDIENT_SEARCH_LIMIT, IngredientFilter, RecipeFilter
+from api.metrics import observe
+from api.pagination import RecipePagination
 from api.permissions import AuthorPermissions
-from api.serializers import (FavoriteSerializer, IngredientInRecipe,
-                             IngredientSerializer, RecipeCreateSerializer,
-                             RecipeSerializer, ShoppingCartSerializer,
-                             SubscribeSerializer, TagSerializer,
-                             UserPasswordSerializer, UserSerializer)
+from api.serializers import (IngredientInRecipe, IngredientSerializer,
+                             LittleRecipeSerializer, RecipeCreateSerializer,
+                             RecipeSerializer, SubscribeSerializer,
+                             TagSerializer, UserPasswordSerializer,
+                             UserSerializer)
+from api.sync import get_changes
+from api.tags import get_tag_map
+from api.toggles import add_relation, mark_recipe_stale, remove_relation
+from api.uploads import get_image_upload_handlers
+from recipes.deletion import delete_recipes
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.signals import mark_popularity_stale
+from recipes.similarity import similar_recipes
 from users.models import Follow, User
 
+SIMILAR_RECIPES_LIMIT = 50
+CHANGES_LIMIT = 100
+MAX_CHANGES_LIMIT = 500
+
+
+def get_target_id(pk):
+    try:
+        return int(pk)
+    except ValueError:
+        raise NotFound
+
+
+class SparseFieldsViewMixin:
+    """
+    Lets clients choose the fields of read responses.
+
+    ?fields=id,name leaves only the listed fields, ?omit=text drops the
+    listed ones. get_queryset checks wants() to skip the joins, prefetches
+    and annotations of fields which are not shown.
+    """
+
+    def get_sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self.parse_sparse_fields()
+        return self._sparse_fields
 
-class UserViewSet(ModelViewSet):
+    def parse_sparse_fields(self):
+        params = self.request.query_params
+        if (self.request.method != 'GET' and self.action != 'lookup'
+                or not ('fields' in params or 'omit' in params)):
+            return None
+        available = self.get_serializer_class()(
+            context=self.get_serializer_context()).output_field_names()
+        fields = set(available)
+        for param in ('fields', 'omit'):
+            names = {name.strip() for name in params.get(param, '').split(',')
+                     if name.strip()}
+            unknown = names - fields
+            if unknown:
+                raise ValidationError({param: 'Unknown fields: {}.'.format(
+                    ', '.join(sorted(unknown)))})
+            if param == 'fields' and names:
+                fields = names
+            if param == 'omit':
+                fields -= names
+        return [name for name in available if name in fields]
+
+    def wants(self, name):
+        fields = self.get_sparse_fields()
+        return fields is None or name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class UserViewSet(SparseFieldsViewMixin, ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (self.request.user.is_authenticated
+                and self.wants('is_subscribed')):
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=self.request.user,
+                                      author=OuterRef('pk'))))
+        return queryset
+
     def retrieve(self, request, *args, **kwargs):
         self.permission_classes = [permissions.IsAuthenticated]
         self.check_permissions(request)
@@ -47,7 +132,10 @@ class UserViewSet(ModelViewSet):
     @action(detail=False, methods=['GET'],
             permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = User.objects.filter(
+            following__user=request.user,
+        ).annotate(recipes_count=Count('recipes')).prefetch_related(
+            'recipes').order_by('pk')
         page = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             page, many=True, context={'request': request})
@@ -56,21 +144,26 @@ class UserViewSet(ModelViewSet):
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[permissions.IsAuthenticated])
     def subscribe(self, request, pk):
-        serializer = SubscribeSerializer(
-            data={'id': pk},
-            context={'request': request, 'method': request.method})
-        serializer.is_valid(raise_exception=True)
+        author_id = get_target_id(pk)
         if request.method == 'POST':
-            subscribe = serializer.save()
-            return Response(SubscribeSerializer(subscribe, context={
-                'request': request,
-                'recipes_limit': request.query_params.get('recipes_limit')
-            }).data, status=status.HTTP_201_CREATED)
-        follow = Follow.objects.get(user=request.user, author_id=pk)
-        if not follow:
+            if author_id == request.user.pk:
+                return Response(
+                    {'errors': 'You don\'t subscribe to yourself.'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            if not add_relation(Follow, request.user.pk, 'author', author_id):
+                get_object_or_404(User, pk=author_id)
+                return Response({'errors': 'Already exist subscribe.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            revisions.touch(revisions.FOLLOWS, request.user.pk)
+            author = User.objects.annotate(
+                recipes_count=Count('recipes')).prefetch_related(
+                'recipes').get(pk=author_id)
+            return Response(SubscribeSerializer(author, context={
+                'request': request}).data, status=status.HTTP_201_CREATED)
+        if not remove_relation(Follow, request.user.pk, 'author', author_id):
             return Response({'errors': 'No subscribe.'},
                             status=status.HTTP_400_BAD_REQUEST)
-        follow.delete()
+        revisions.touch(revisions.FOLLOWS, request.user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -79,6 +172,10 @@ class TagViewSet(ModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        tags = sorted(get_tag_map().values(), key=lambda tag: tag.name)
+        return Response(self.get_serializer(tags, many=True).data)
+
 
 class IngredientViewSet(ModelViewSet):
     queryset = Ingredient.objects.all()
@@ -87,12 +184,155 @@ class IngredientViewSet(ModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        Ingredients change rarely and are searched on every keystroke,
+        so the results are cached until any ingredient changes.
+        """
+        key = hashlib.sha1(repr(
+            sorted(request.query_params.lists())).encode()).hexdigest()
+        return Response(ingredient_lists.get_or_set(
+            key, partial(self.list_data, request, *args, **kwargs),
+            namespaces=(revisions.INGREDIENTS,)))
+
+    def list_data(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.request.query_params.get('name'):
+            return queryset[:INGREDIENT_SEARCH_LIMIT]
+        return queryset
+
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(SparseFieldsViewMixin, ModelViewSet):
     queryset = Recipe.objects.all().order_by('-id')
     serializer_class = RecipeSerializer
     filter_backends = (rest_framework.DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        """
+        Loads everything RecipeSerializer shows in a fixed number of queries.
+        """
+        queryset = super().get_queryset()
+        if self.wants('author'):
+            queryset = queryset.select_related('author')
+        if self.wants('tags'):
+            queryset = queryset.prefetch_related('tags')
+        if self.wants('ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingridientinrecipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient')))
+        if not self.wants('text'):
+            queryset = queryset.defer('text')
+        user = self.request.user
+        if user.is_authenticated and self.wants('is_favorited'):
+            queryset = queryset.annotate(is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))))
+        if user.is_authenticated and self.wants('is_in_shopping_cart'):
+            queryset = queryset.annotate(is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        view = super().list
+        if 'ids' in request.query_params:
+            view = self.get_many
+        return self.conditional_response(
+            request, revisions.get_revision(revisions.RECIPES),
+            view, *args, **kwargs)
+
+    def get_many(self, request, *args, **kwargs):
+        return self.many_response(
+            request, request.query_params['ids'].split(','))
+
+    @action(detail=False, methods=['POST'])
+    def lookup(self, request):
+        ids = (request.data.get('ids') if isinstance(request.data, dict)
+               else None)
+        if not isinstance(ids, list):
+            return Response({'ids': 'A list of recipe ids is required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return self.many_response(request, ids)
+
+    def many_response(self, request, ids):
+        """
+        Recipes with the given ids in the requested order.
+
+        Unknown ids are skipped, repeated ones are returned once.
+        """
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            return Response({'ids': 'Recipe ids must be integers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.RECIPE_MULTI_GET_MAX_SIZE:
+            return Response(
+                {'ids': 'No more than {} recipes at once.'.format(
+                    settings.RECIPE_MULTI_GET_MAX_SIZE)},
+                status=status.HTTP_400_BAD_REQUEST)
+        recipes = self.filter_queryset(self.get_queryset()).in_bulk(ids)
+        return Response(self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            updated_at = Recipe.objects.filter(
+                pk=kwargs['pk']).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            updated_at = None
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            request, updated_at.timestamp(),
+            super().retrieve, *args, **kwargs)
+
+    def conditional_response(self, request, revision, view, *args, **kwargs):
+        """
+        Answer 304 when the client has the current version of the page.
+
+        The version is made of the recipe data revision, the revisions of
+        authors, tags and ingredients and the requesting user's favorites,
+        cart and subscriptions, so it is checked without serializing.
+        The ETag is the validator to use: Last-Modified has a resolution
+        of one second and stays the same for changes within a second.
+        The ETag also identifies the page in the cache, so a client
+        without it gets the page without queries while nothing changes.
+        """
+        versions = [revision] + revisions.get_revisions(
+            (revisions.USERS, revisions.TAGS, revisions.INGREDIENTS),
+            request.user)
+        etag = hashlib.sha1(repr(
+            [request.build_absolute_uri(), request.user.pk, versions]
+        ).encode()).hexdigest()
+        last_modified = int(max(versions))
+        response = get_conditional_response(
+            request, etag=quote_etag(etag), last_modified=last_modified)
+        if response is None:
+            status_code, data = recipe_pages.get_or_set(
+                etag, partial(self.render_page, view, request, *args,
+                              **kwargs))
+            response = Response(data, status=status_code)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = quote_etag(etag)
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def render_page(view, request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        return response.status_code, response.data
+
+    def initialize_request(self, request, *args, **kwargs):
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            request.upload_handlers = get_image_upload_handlers(request)
+        return super().initialize_request(request, *args, **kwargs)
 
     def create(self, request):
         self.permission_classes = (permissions.IsAuthenticated,
@@ -103,9 +343,36 @@ class RecipeViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         recipe = serializer.save()
         return Response(RecipeSerializer(
-            recipe, context={'request': request}
+            self.get_queryset().get(pk=recipe.pk),
+            context={'request': request}
         ).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['POST'],
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        Create up to RECIPE_BULK_MAX_SIZE recipes given as a JSON list.
+
+        Every item gets its own result, created or failed with errors.
+        """
+        if not isinstance(request.data, list):
+            return Response({'errors': 'A list of recipes is required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.RECIPE_BULK_MAX_SIZE:
+            return Response(
+                {'errors': 'No more than {} recipes at once.'.format(
+                    settings.RECIPE_BULK_MAX_SIZE)},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': create_recipes(request.data, request)})
+
+    @action(detail=False, methods=['POST'],
+            permission_classes=[permissions.IsAuthenticated])
+    def event_ticket(self, request):
+        """
+        Single-use ticket for the ticket parameter of the event stream.
+        """
+        return Response({'ticket': events.issue_ticket(request.user)})
+
     def update(self, request, pk, *args, **kwargs):
         self.permission_classes = (permissions.IsAuthenticated,
                                    AuthorPermissions,)
@@ -116,8 +383,10 @@ class RecipeViewSet(ModelViewSet):
                                             context={'request': request})
         serializer.is_valid(raise_exception=True)
         recipe = serializer.save()
-        return Response(
-            RecipeSerializer(recipe, context={'request': request}).data)
+        return Response(RecipeSerializer(
+            self.get_queryset().get(pk=recipe.pk),
+            context={'request': request}
+        ).data)
 
     def destroy(self, request, pk, *args, **kwargs):
         self.permission_classes = (permissions.IsAuthenticated,
@@ -125,49 +394,74 @@ class RecipeViewSet(ModelViewSet):
         self.check_permissions(request)
         obj = get_object_or_404(Recipe, pk=pk)
         self.check_object_permissions(request, obj)
-        return super().destroy(request)
+        delete_recipes([obj.pk])
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[permissions.IsAuthenticated])
     def favorite(self, request, pk):
-        serializer = FavoriteSerializer(
-            data={'id': pk},
-            context={'request': request, 'method': request.method})
-        serializer.is_valid(raise_exception=True)
-        if request.method == 'POST':
-            favorite = serializer.save()
-            return Response(FavoriteSerializer(favorite, context={
-                'request': request,
-            }).data, status=status.HTTP_201_CREATED)
-        favorite = Favorite.objects.get(user=request.user,
-                                        recipe_id=pk)
-        if not favorite:
-            return Response({'error': 'Recipe not found'},
-                            status=status.HTTP_404_NOT_FOUND)
-        else:
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.toggle(request, pk, Favorite, revisions.FAVORITES,
+                           'Already in favorite.', 'Recipe not in favorite.')
 
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[permissions.IsAuthenticated])
     def shopping_cart(self, request, pk):
-        serializer = ShoppingCartSerializer(
-            data={'id': pk},
-            context={'request': request, 'method': request.method})
-        serializer.is_valid(raise_exception=True)
+        return self.toggle(request, pk, ShoppingCart, revisions.SHOPPING_CART,
+                           'Recipe already in list.', 'Recipe not in list.')
+
+    def toggle(self, request, pk, model, namespace, exists, missing):
+        """
+        Add the recipe to or remove it from the user's favorites or cart.
+
+        A successful click takes two statements: the insert or delete and
+        the update of the recipe popularity flag, which on POST also
+        returns the recipe card.
+        """
+        recipe_id = get_target_id(pk)
         if request.method == 'POST':
-            shopping_list = serializer.save()
-            return Response(ShoppingCartSerializer(shopping_list, context={
-                'request': request,
-            }).data, status=status.HTTP_201_CREATED)
-        shopping_cart = ShoppingCart.objects.get(user=request.user,
-                                                 recipe_id=pk)
-        if not shopping_cart:
-            return Response({'message': 'Object not found.'},
-                            status=status.HTTP_404_NOT_FOUND)
-        else:
-            shopping_cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            if not add_relation(model, request.user.pk, 'recipe', recipe_id):
+                get_object_or_404(Recipe, pk=recipe_id)
+                return Response({'errors': exists},
+                                status=status.HTTP_400_BAD_REQUEST)
+            recipe = mark_recipe_stale(recipe_id)
+            revisions.touch(namespace, request.user.pk)
+            return Response(LittleRecipeSerializer(
+                recipe, context={'request': request}).data,
+                status=status.HTTP_201_CREATED)
+        if not remove_relation(model, request.user.pk, 'recipe', recipe_id):
+            return Response({'errors': missing},
+                            status=status.HTTP_400_BAD_REQUEST)
+        mark_popularity_stale(recipe_id)
+        revisions.touch(namespace, request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['GET'])
+    def changes(self, request):
+        try:
+            limit = int(request.query_params.get('limit', CHANGES_LIMIT))
+        except ValueError:
+            return Response({'errors': 'Limit must be a number.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        changes = get_changes(request.query_params.get('since'),
+                              max(1, min(limit, MAX_CHANGES_LIMIT)),
+                              self.get_queryset())
+        changes['updated'] = self.get_serializer(
+            changes['updated'], many=True).data
+        return Response(changes)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            limit = int(request.query_params.get(
+                'limit', api_settings.PAGE_SIZE))
+        except ValueError:
+            return Response({'errors': 'Limit must be a number.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        recipes = similar_recipes(
+            recipe, max(1, min(limit, SIMILAR_RECIPES_LIMIT)))
+        return Response(LittleRecipeSerializer(
+            recipes, many=True, context={'request': request}).data)
 
     @action(detail=False, methods=['GET'],
             permission_classes=[permissions.IsAuthenticated])
@@ -190,6 +484,7 @@ class RecipeViewSet(ModelViewSet):
                 f'{ingredient.name}, {amount}, {ingredient.measurement_unit}\n'
             )
         response = HttpResponse(list_text, content_type='text/plain')
+        observe('foodgram_shopping_list_bytes', len(response.content))
         response['Content-Disposition'] = (
             'attachment; filename=shopping_list.txt'
         )
@@ -2,6 +2,8 @@
 ASGI config for foodgram_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The stream of new recipes is served here directly, every other request
+goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +15,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.events import EVENTS_PATH, recipe_events  # noqa: E402
+from api.metrics import registry  # noqa: E402
+
+registry.enabled = True
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        await recipe_events(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_count(model, using='default'):
+    """
+    Row count of the model table from the planner statistics.
+
+    Returns None when the database keeps no such statistics.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            (model._meta.db_table,))
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which does not count unfiltered large tables.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if (estimate is not None
+                    and estimate >= settings.ESTIMATED_COUNT_THRESHOLD):
+                return estimate
+        return self.exact_count()
+
+    def exact_count(self):
+        return self.object_list.count()
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -30,10 +31,13 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'tasks.apps.TasksConfig',
     'colorfield',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.querylog.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
@@ -75,6 +80,31 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              os.path.join(BASE_DIR, 'cache/')),
+    }
+}
+
+TIERED_CACHE_ALIAS = 'default'
+
+CACHE_TIMEOUT = 5 * 60
+
+CACHE_L1_TIMEOUT = 60
+
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000))
+
+CACHE_LOCK_TIMEOUT = 10
+
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+COUNT_CACHE_TIMEOUT = 10 * 60
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -108,6 +138,89 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024))
+
+RECIPE_IMAGE_CONTENT_TYPES = ('image/png', 'image/jpeg', 'image/gif',
+                              'image/webp')
+
+RECIPE_MULTI_GET_MAX_SIZE = int(os.getenv('RECIPE_MULTI_GET_MAX_SIZE', 100))
+
+RECIPE_BULK_MAX_SIZE = int(os.getenv('RECIPE_BULK_MAX_SIZE', 100))
+
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles/')
+
+PROFILE_MAX_REPORTS = 50
+
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics/')
+
+METRICS_FLUSH_INTERVAL = 5
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 0.5))
+
+SLOW_QUERY_EXPLAIN_INTERVAL = 10 * 60
+
+SLOW_QUERY_EXPLAIN_LIMIT = 256
+
+STATEMENT_TIMEOUT = int(os.getenv('STATEMENT_TIMEOUT', 5000))
+
+STATEMENT_TIMEOUTS = {
+    'RecipeViewSet.list': 3000,
+    'RecipeViewSet.retrieve': 2000,
+    'RecipeViewSet.download_shopping_cart': 10000,
+    'RecipeViewSet.changes': 10000,
+    'RecipeViewSet.bulk': 30000,
+    'IngredientViewSet.list': 2000,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.querylog': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+TASK_WORKERS = int(os.getenv('TASK_WORKERS', 4))
+
+TASK_POLL_INTERVAL = 1
+
+TASK_LOCK_TIMEOUT = 15 * 60
+
+TASK_STARTUP_RETRY_INTERVAL = 5
+
+SYNC_CLOCK_MARGIN = 1
+
+SYNC_MAX_LAG = 60
+
+SSE_CHANNEL = 'foodgram_recipes'
+
+SSE_HEARTBEAT_INTERVAL = 15
+
+SSE_RECONNECT_DELAY = 5
+
+SSE_MAX_CONNECTIONS = int(os.getenv('SSE_MAX_CONNECTIONS', 1000))
+
+SSE_QUEUE_SIZE = 100
+
+SSE_REPLAY_LIMIT = 50
+
+SSE_TICKET_TIMEOUT = 30
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -18,9 +18,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics_view
+from api.profiling import profile_detail, profile_list
+
 urlpatterns = [
+    path('admin/profiles/', profile_list, name='profiles'),
+    path('admin/profiles/<str:name>/', profile_detail, name='profile'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls', namespace='api')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,38 @@
+import gc
+import logging
+
+from django.apps import apps
+from django.db import DatabaseError, connection, connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """
+    Load in the gunicorn master what every worker would load on its own.
+
+    Imports every view through the URL resolver, fills model metadata
+    caches, the tag map and, without pg_trgm, the ingredient name index.
+    Database connections are closed so that workers do not share them,
+    and the loaded objects are frozen to stay shared copy-on-write.
+    Without a ready database the data is left for the workers to load.
+    """
+    from api import revisions
+    from api.tags import get_tag_map
+    from recipes.models import Ingredient
+    from recipes.search import get_index
+
+    get_resolver()._populate()
+    for model in apps.get_models():
+        model._meta.get_fields()
+    try:
+        get_tag_map()
+        if connection.vendor != 'postgresql':
+            get_index(Ingredient, 'name',
+                      revisions.get_revision(revisions.INGREDIENTS))
+    except DatabaseError:
+        logger.exception('Database is not ready, data is not warmed up.')
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
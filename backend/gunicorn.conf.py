@@ -0,0 +1,16 @@
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8080')
+workers = int(os.getenv('GUNICORN_WORKERS',
+                        multiprocessing.cpu_count() * 2 + 1))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def when_ready(server):
+    """
+    Warm the preloaded application before the workers are forked.
+    """
+    if preload_app:
+        from foodgram_backend.warmup import warm_up
+        warm_up()
@@ -1,4 +1,8 @@
 from django.contrib import admin
+from django.db.models import Count
+
+from foodgram_backend.pagination import EstimatedCountPaginator
+from recipes.deletion import CascadeDeleteAdminMixin, delete_recipes
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                             ShoppingCart, Tag)
 
@@ -6,28 +10,72 @@ from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('measurement_unit', 'name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('name',)
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'color',)
+    search_fields = ('name', 'slug',)
 
 
 class RecipeIngredientInLine(admin.TabularInline):
     model = IngredientInRecipe
     min_num = 1
-    list_display = ('id', 'amount', 'ingredient', 'recipe')
-    list_editable = ('amount', 'ingredient', 'recipe')
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(CascadeDeleteAdminMixin, admin.ModelAdmin):
     inlines = (RecipeIngredientInLine,)
     list_display = ('add_favorites', 'author', 'name',)
-    list_filter = ('author', 'name', 'tags',)
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username',)
+    autocomplete_fields = ('author', 'tags',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    delete_function = staticmethod(delete_recipes)
+    delete_select_related = ('author',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorites_count=Count('favorites'))
 
     @staticmethod
+    @admin.display(description='Favorites', ordering='favorites_count')
     def add_favorites(obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe__author',)
+    search_fields = ('user__username', 'recipe__name',)
+    autocomplete_fields = ('user', 'recipe',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Favorite)
+class FavoriteAdmin(UserRecipeAdmin):
+    pass
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(UserRecipeAdmin):
+    pass
 
 
-admin.site.register(Favorite)
-admin.site.register(IngredientInRecipe)
-admin.site.register(Tag)
-admin.site.register(ShoppingCart)
+@admin.register(IngredientInRecipe)
+class IngredientInRecipeAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'ingredient', 'amount',)
+    list_select_related = ('recipe__author', 'ingredient',)
+    search_fields = ('recipe__name', 'ingredient__name',)
+    autocomplete_fields = ('recipe', 'ingredient',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
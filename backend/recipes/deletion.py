@@ -0,0 +1,220 @@
+import logging
+from functools import lru_cache, partial
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import CASCADE, Q, QuerySet
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.signals import recipes_deleted, users_deleted
+from users.models import Follow, User
+
+DELETE_CHUNK_SIZE = 500
+OWN_APPS = ('recipes', 'users')
+
+logger = logging.getLogger(__name__)
+
+
+def fast_delete_supported():
+    """
+    Foreign keys to recipes and users cascade in the database only on
+    PostgreSQL, see migration 0007_cascade_deletes.
+    """
+    return connection.vendor == 'postgresql' and database_cascades()
+
+
+def cascading_columns():
+    """
+    Tables and columns of own foreign keys that 0007 makes cascade.
+    """
+    targets = {Recipe, User}
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.app_label not in OWN_APPS:
+            continue
+        for field in model._meta.local_fields:
+            if (field.many_to_one or field.one_to_one) and (
+                    field.remote_field.model in targets
+                    and field.remote_field.on_delete is CASCADE):
+                yield model._meta.db_table, field.column
+
+
+@lru_cache(maxsize=None)
+def database_cascades():
+    """
+    Whether every such foreign key still cascades in the database.
+
+    A later AlterField recreates the constraint without ON DELETE; then
+    the Django collector deletes the rows instead, checked once per
+    process.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rel.relname, col.attname FROM pg_constraint AS fk '
+            'JOIN pg_class AS rel ON rel.oid = fk.conrelid '
+            'JOIN pg_attribute AS col ON col.attrelid = fk.conrelid '
+            'AND col.attnum = fk.conkey[1] '
+            "WHERE fk.contype = 'f' AND fk.confdeltype = 'c'")
+        cascading = set(cursor.fetchall())
+    missing = set(cascading_columns()) - cascading
+    if missing:
+        logger.warning('Foreign keys do not cascade in the database, '
+                       'deleting through Django: %s', sorted(missing))
+    return not missing
+
+
+def delete_foreign_rows(model, pks):
+    """
+    Delete the rows of other apps referencing the objects, their
+    foreign keys do not cascade in the database.
+    """
+    for related in model._meta.related_objects:
+        if (related.related_model._meta.app_label not in OWN_APPS
+                and related.on_delete is CASCADE):
+            related.related_model._base_manager.filter(
+                **{f'{related.field.name}__in': pks}).delete()
+
+
+def lock(model, pks):
+    """
+    Lock the rows, so that nothing new references them before they go.
+    """
+    list(model.objects.select_for_update().filter(
+        pk__in=pks).values_list('pk', flat=True))
+
+
+def readers(model, **lookups):
+    return set(model.objects.filter(**lookups).values_list(
+        'user_id', flat=True))
+
+
+def chunks(items, size=DELETE_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def raw_delete(model, pks, returning):
+    """
+    Delete rows by primary key in one statement and return the columns.
+    """
+    quote = connection.ops.quote_name
+    sql = 'DELETE FROM {table} WHERE {pk} = ANY(%s) RETURNING {fields}'.format(
+        table=quote(model._meta.db_table),
+        pk=quote(model._meta.pk.column),
+        fields=', '.join(quote(model._meta.get_field(name).column)
+                         for name in returning),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(pks)])
+        return cursor.fetchall()
+
+
+def delete_files(names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def delete_recipes(recipe_ids):
+    """
+    Delete recipes with everything attached to them and their images.
+
+    On PostgreSQL every chunk is one DELETE and the database cascades it
+    to ingredients, tags, favorites, carts and similarity rows, so no row
+    is loaded into Python; the readers who lose favorites or cart items
+    are sent with recipes_deleted. Elsewhere the Django collector deletes
+    them. Image files are removed once the chunk is committed.
+    """
+    deleted = 0
+    for chunk in chunks(recipe_ids):
+        with transaction.atomic():
+            if fast_delete_supported():
+                lock(Recipe, chunk)
+                favorite_users = readers(Favorite, recipe_id__in=chunk)
+                cart_users = readers(ShoppingCart, recipe_id__in=chunk)
+                delete_foreign_rows(Recipe, chunk)
+                rows = raw_delete(Recipe, chunk, ('id', 'image'))
+                if rows:
+                    recipes_deleted.send(
+                        sender=Recipe, recipe_ids=[pk for pk, _ in rows],
+                        favorite_users=favorite_users,
+                        cart_users=cart_users)
+            else:
+                rows = list(Recipe.objects.filter(
+                    pk__in=chunk).values_list('pk', 'image'))
+                Recipe.objects.filter(pk__in=chunk).delete()
+            transaction.on_commit(
+                partial(delete_files, [image for _, image in rows]))
+        deleted += len(rows)
+    return deleted
+
+
+def delete_users(user_ids):
+    """
+    Delete users with their recipes, subscriptions, favorites and carts.
+
+    Recipes go through delete_recipes, so their images are removed too.
+    Recipes of other authors lose favorites and carts of the deleted
+    users, so their popularity is marked for recount, and the readers
+    following them are sent with users_deleted.
+    """
+    user_ids = list(user_ids)
+    recipe_ids = Recipe.objects.filter(
+        author_id__in=user_ids).values_list('pk', flat=True)
+    delete_recipes(recipe_ids)
+    Recipe.objects.filter(
+        Q(pk__in=Favorite.objects.filter(
+            user_id__in=user_ids).values('recipe_id'))
+        | Q(pk__in=ShoppingCart.objects.filter(
+            user_id__in=user_ids).values('recipe_id'))
+    ).update(popularity_stale=True)
+    deleted = 0
+    for chunk in chunks(user_ids):
+        with transaction.atomic():
+            if fast_delete_supported():
+                lock(User, chunk)
+                followers = set(Follow.objects.filter(
+                    author_id__in=chunk).values_list('user_id', flat=True))
+                delete_foreign_rows(User, chunk)
+                rows = raw_delete(User, chunk, ('id',))
+                if rows:
+                    users_deleted.send(
+                        sender=User, user_ids=[pk for pk, in rows],
+                        followers=followers.difference(chunk))
+                deleted += len(rows)
+            else:
+                deleted += len(chunk)
+                User.objects.filter(pk__in=chunk).delete()
+    return deleted
+
+
+class CascadeDeleteAdminMixin:
+    """
+    ModelAdmin deleting objects with delete_function.
+
+    The default confirmation page loads every related row to list it;
+    with cascading constraints only the deleted objects are shown, with
+    delete_select_related loaded for their names.
+    """
+    delete_function = None
+    delete_select_related = ()
+
+    def delete_model(self, request, obj):
+        self.delete_function([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        self.delete_function(queryset.values_list('pk', flat=True))
+
+    def get_deleted_objects(self, objs, request):
+        if not fast_delete_supported():
+            return super().get_deleted_objects(objs, request)
+        if self.delete_select_related and isinstance(objs, QuerySet):
+            objs = objs.select_related(*self.delete_select_related)
+        objs = list(objs)
+        opts = self.model._meta
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(opts.verbose_name)
+        return ([str(obj) for obj in objs],
+                {opts.verbose_name_plural: len(objs)}, perms_needed, [])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.similarity import update_signatures
+
+
+class Command(BaseCommand):
+    help = 'Build MinHash signatures of recipes for similar recipes search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild signatures of every recipe.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(signature__isnull=True)
+        last_pk = 0
+        total = 0
+        while True:
+            pks = list(recipes.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            update_signatures(pks)
+            last_pk = pks[-1]
+            total += len(pks)
+        self.stdout.write(f'Signatures built for {total} recipes.')
@@ -0,0 +1,81 @@
+import base64
+import json
+import mimetypes
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import IngredientInRecipe, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Export recipes with ingredients and tags as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='File to write, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--images', action='store_true',
+                            help='Embed images as base64 data URIs.')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            write = self.stdout.write
+            count = self.export(write, options)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                count = self.export(
+                    lambda line: file.write(line + '\n'), options)
+        self.stderr.write(f'{count} recipes exported.')
+
+    def export(self, write, options):
+        count = 0
+        for recipe in iterate_recipes(options['chunk_size']):
+            write(json.dumps(recipe_to_dict(recipe, options['images']),
+                             ensure_ascii=False))
+            count += 1
+        return count
+
+
+def iterate_recipes(chunk_size):
+    """
+    Recipes in primary key order, fetched and prefetched chunk by chunk.
+    """
+    recipes = Recipe.objects.order_by('pk').select_related(
+        'author'
+    ).prefetch_related(
+        'tags',
+        Prefetch('ingridientinrecipe',
+                 queryset=IngredientInRecipe.objects.select_related(
+                     'ingredient')),
+    )
+    last_pk = 0
+    while True:
+        chunk = list(recipes.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].pk
+
+
+def recipe_to_dict(recipe, embed_image=False):
+    image = recipe.image.name
+    if embed_image and image:
+        content_type = mimetypes.guess_type(image)[0] or 'image/png'
+        with recipe.image.open('rb') as file:
+            image = (f'data:{content_type};base64,'
+                     + base64.b64encode(file.read()).decode())
+    return {
+        'author': recipe.author.email,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': image,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [{
+            'name': item.ingredient.name,
+            'measurement_unit': item.ingredient.measurement_unit,
+            'amount': item.amount,
+        } for item in recipe.ingridientinrecipe.all()],
+    }
@@ -0,0 +1,168 @@
+import base64
+import json
+import sys
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes.deletion import delete_files
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from recipes.signals import ingredients_created, recipes_created
+from recipes.similarity import update_signatures
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from NDJSON made by export_recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-',
+                            help='File to read, stdin by default.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            stats = RecipeImporter(options['batch_size']).run(sys.stdin)
+        else:
+            with open(options['input'], encoding='utf-8') as file:
+                stats = RecipeImporter(options['batch_size']).run(file)
+        self.stdout.write(
+            'Recipes imported: {created}, duplicates: {duplicates}, '
+            'skipped: {skipped}.'.format(**stats))
+
+
+class RecipeImporter:
+    """
+    Imports recipes batch by batch with bulk inserts.
+
+    Ingredients and tags are resolved through maps loaded once, authors
+    through one query per batch. Bulk inserts send no model signals, so
+    recipes_created and ingredients_created announce every batch.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.stats = {'created': 0, 'duplicates': 0, 'skipped': 0}
+
+    def run(self, lines):
+        rows = (json.loads(line) for line in lines if line.strip())
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return self.stats
+            self.saved_images = []
+            try:
+                with transaction.atomic():
+                    self.import_batch(batch)
+            except BaseException:
+                delete_files(self.saved_images)
+                raise
+
+    def import_batch(self, batch):
+        authors = dict(User.objects.filter(
+            email__in={row['author'] for row in batch}
+        ).values_list('email', 'pk'))
+        self.add_missing_ingredients(batch)
+        rows = {}
+        for row in batch:
+            if (row['author'] not in authors
+                    or any(slug not in self.tags for slug in row['tags'])):
+                self.stats['skipped'] += 1
+                continue
+            content_hash = Recipe.make_content_hash(
+                row['name'], row['text'], row['cooking_time'])
+            if content_hash in rows:
+                self.stats['duplicates'] += 1
+                continue
+            rows[content_hash] = row
+        existing = set(Recipe.objects.filter(
+            content_hash__in=rows).values_list('content_hash', flat=True))
+        self.stats['duplicates'] += len(existing)
+        recipes = [
+            Recipe(
+                author_id=authors[row['author']],
+                name=row['name'],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=self.save_image(row['image']),
+                content_hash=content_hash,
+            )
+            for content_hash, row in rows.items()
+            if content_hash not in existing
+        ]
+        Recipe.objects.bulk_create(recipes)
+        pks = dict(Recipe.objects.filter(
+            content_hash__in=[recipe.content_hash for recipe in recipes]
+        ).values_list('content_hash', 'pk'))
+        for recipe in recipes:
+            recipe.pk = pks[recipe.content_hash]
+            recipe.pub_date = parse_datetime(
+                rows[recipe.content_hash]['pub_date'])
+            recipe.popularity = Recipe.popularity_score(
+                0, 0, recipe.pub_date)
+        Recipe.objects.bulk_update(recipes, ('pub_date', 'popularity'))
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_id=recipe.pk,
+                ingredient_id=self.ingredients[
+                    (item['name'], item['measurement_unit'])],
+                amount=item['amount'])
+            for recipe in recipes
+            for item in rows[recipe.content_hash]['ingredients']
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk,
+                                tag_id=self.tags[slug])
+            for recipe in recipes
+            for slug in rows[recipe.content_hash]['tags']
+        )
+        update_signatures(list(pks.values()))
+        if recipes:
+            transaction.on_commit(partial(
+                recipes_created.send, sender=Recipe, recipes=recipes,
+                recipe_ids=[recipe.pk for recipe in recipes]))
+        self.stats['created'] += len(recipes)
+
+    def add_missing_ingredients(self, batch):
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for row in batch for item in row['ingredients']
+        } - self.ingredients.keys()
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing),
+            ignore_conflicts=True)
+        ingredients_created.send(sender=Ingredient)
+        for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in missing}
+        ).values_list('pk', 'name', 'measurement_unit'):
+            self.ingredients[(name, unit)] = pk
+
+    def save_image(self, image):
+        """
+        Data URIs are written to the storage, names are kept as they are.
+
+        Written files are deleted again when the batch is rolled back.
+        """
+        if not image.startswith('data:'):
+            return image
+        type_image, data = image.split(';base64,')
+        name = datetime.now().strftime("%Y%m%d%H%M%S")
+        name = default_storage.save(
+            f"recipes/media/{name}.{type_image.split('/')[-1]}",
+            ContentFile(base64.b64decode(data)))
+        self.saved_images.append(name)
+        return name
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import Recipe
+from recipes.signals import popularity_updated
+
+
+class Command(BaseCommand):
+    help = ('Recount popularity of recipes whose favorites or shopping '
+            'carts changed since the last run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Recount every recipe.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Recipe.objects.update(popularity_stale=True)
+        total = 0
+        while True:
+            updated = update_popularity(options['batch_size'])
+            if not updated:
+                break
+            total += updated
+        self.stdout.write(f'Popularity updated for {total} recipes.')
+
+
+def update_popularity(batch_size):
+    """
+    Recount one batch of stale recipes and return its size.
+
+    The batch is locked, recounted and cleared in one transaction, so a
+    failed run leaves it stale. A favorite added meanwhile marks the
+    recipe stale again once the batch commits, for the next batch.
+    """
+    with transaction.atomic():
+        pks = list(Recipe.objects.select_for_update(
+            skip_locked=True).filter(popularity_stale=True).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return 0
+        recipes = Recipe.objects.filter(pk__in=pks).only('pub_date').annotate(
+            favorites_count=Count('favorites', distinct=True),
+            shopping_count=Count('shopping_list', distinct=True),
+        )
+        for recipe in recipes:
+            recipe.popularity = Recipe.popularity_score(
+                recipe.favorites_count, recipe.shopping_count,
+                recipe.pub_date)
+            recipe.popularity_stale = False
+        Recipe.objects.bulk_update(
+            recipes, ('popularity', 'popularity_stale'))
+        popularity_updated.send(sender=Recipe, recipe_ids=pks)
+    return len(pks)
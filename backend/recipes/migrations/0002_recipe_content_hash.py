@@ -0,0 +1,69 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:20
+
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def make_content_hash(name, text, cooking_time):
+    normalized = '\x1f'.join((
+        ' '.join(name.split()).casefold(),
+        ' '.join(text.split()).casefold(),
+        str(int(cooking_time)),
+    ))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def fill_content_hash(apps, schema_editor):
+    """
+    Older duplicates keep an empty hash, the unique index ignores NULL.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    seen = set()
+    recipes = []
+    for recipe in Recipe.objects.only(
+            'name', 'text', 'cooking_time').order_by('pk').iterator():
+        content_hash = make_content_hash(
+            recipe.name, recipe.text, recipe.cooking_time)
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        recipe.content_hash = content_hash
+        recipes.append(recipe)
+    Recipe.objects.bulk_update(recipes, ('content_hash',), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientinrecipe',
+            options={'verbose_name': 'Ingredient', 'verbose_name_plural': 'Ingredients'},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, verbose_name='Content hash'),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipe',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True, verbose_name='Content hash'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientinrecipe',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingridientinrecipe', to='recipes.ingredient', verbose_name='Ingredient'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientinrecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingridientinrecipe', to='recipes.recipe', verbose_name='Recipe'),
+        ),
+    ]
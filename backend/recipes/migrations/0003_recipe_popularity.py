@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False, verbose_name='Popularity'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity_stale',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Popularity needs recount'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('popularity_stale', True)), fields=['popularity_stale'], name='recipe_popularity_stale_idx'),
+        ),
+    ]
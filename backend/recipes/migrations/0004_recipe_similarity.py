@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSignature',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='recipes.recipe', verbose_name='Recipe')),
+                ('minhash', models.BinaryField(verbose_name='MinHash')),
+            ],
+            options={
+                'verbose_name': 'Recipe signature',
+                'verbose_name_plural': 'Recipe signatures',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.BigIntegerField(db_index=True, verbose_name='Band hash')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='recipes.recipe', verbose_name='Recipe')),
+            ],
+            options={
+                'verbose_name': 'Recipe band',
+                'verbose_name_plural': 'Recipe bands',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def set_updated_at(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=models.F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(verbose_name='Recipe id')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Deletion date')),
+            ],
+            options={
+                'verbose_name': 'Deleted recipe',
+                'verbose_name_plural': 'Deleted recipes',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Update date'),
+        ),
+        migrations.RunPython(set_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at', 'id'], name='recipe_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetombstone',
+            index=models.Index(fields=['deleted_at', 'recipe_id'], name='tombstone_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations, models
+
+TARGETS = (('recipes', 'Recipe'), ('users', 'User'))
+OWN_APPS = ('recipes', 'users')
+
+
+def cascading_fields(apps):
+    """
+    Foreign keys with on_delete=CASCADE to recipes and users in the
+    tables of these apps, including their many-to-many tables. Tables of
+    other apps are left as they are.
+    """
+    targets = {apps.get_model(*target) for target in TARGETS}
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.app_label not in OWN_APPS:
+            continue
+        for field in model._meta.local_fields:
+            if (field.many_to_one or field.one_to_one) and (
+                    field.remote_field.model in targets
+                    and field.remote_field.on_delete is models.CASCADE):
+                yield model, field
+
+
+def set_on_delete(apps, schema_editor, action):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for model, field in cascading_fields(apps):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table)
+        target = field.remote_field.model._meta
+        for name, constraint in constraints.items():
+            if not (constraint['foreign_key']
+                    and constraint['columns'] == [field.column]):
+                continue
+            schema_editor.execute(
+                f'ALTER TABLE {quote(table)} '
+                f'DROP CONSTRAINT {quote(name)}, '
+                f'ADD CONSTRAINT {quote(name)} '
+                f'FOREIGN KEY ({quote(field.column)}) '
+                f'REFERENCES {quote(target.db_table)} '
+                f'({quote(target.pk.column)}) {action} '
+                f'DEFERRABLE INITIALLY DEFERRED NOT VALID')
+            schema_editor.execute(
+                f'ALTER TABLE {quote(table)} '
+                f'VALIDATE CONSTRAINT {quote(name)}')
+
+
+def add_cascade(apps, schema_editor):
+    set_on_delete(apps, schema_editor, 'ON DELETE CASCADE')
+
+
+def remove_cascade(apps, schema_editor):
+    set_on_delete(apps, schema_editor, '')
+
+
+class Migration(migrations.Migration):
+    """
+    Lets the database delete rows of recipes and users.
+
+    Django declares these foreign keys without ON DELETE and cascades in
+    Python; with the constraints cascading, recipes.deletion removes a
+    recipe or a user with one DELETE after deleting the rows of other
+    apps itself.
+    """
+
+    dependencies = [
+        ('recipes', '0006_recipe_changes'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_cascade, remove_cascade),
+    ]
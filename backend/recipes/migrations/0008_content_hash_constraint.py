@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_cascade_deletes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, verbose_name='Content hash'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(fields=('content_hash',), name='unique_recipe_content_hash'),
+        ),
+    ]
@@ -1,12 +1,20 @@
+import hashlib
+import math
+
 from colorfield.fields import ColorField
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import models
+from django.utils import timezone
 
 from users.models import User
 
 MINIMUM_QUANTITY = 1
 MAXIMUM_QUANTITY = 32000
+POPULARITY_HALF_LIFE = 7 * 24 * 60 * 60
+FAVORITE_WEIGHT = 2
+SHOPPING_CART_WEIGHT = 1
+CONTENT_HASH_CONSTRAINT = 'unique_recipe_content_hash'
 
 
 class Ingredient(models.Model):
@@ -112,6 +120,10 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Publications date'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Update date'
+    )
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Tags'
@@ -119,8 +131,45 @@ class Recipe(models.Model):
     text = models.TextField(
         verbose_name='Description'
     )
+    content_hash = models.CharField(
+        max_length=64,
+        null=True,
+        editable=False,
+        verbose_name='Content hash'
+    )
+    popularity = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Popularity'
+    )
+    popularity_stale = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Popularity needs recount'
+    )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('content_hash',),
+                name=CONTENT_HASH_CONSTRAINT
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('-popularity', '-id'),
+                name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='recipe_updated_idx'
+            ),
+            models.Index(
+                fields=('popularity_stale',),
+                name='recipe_popularity_stale_idx',
+                condition=models.Q(popularity_stale=True)
+            ),
+        ]
         ordering = ('-pub_date',)
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
@@ -128,6 +177,87 @@ class Recipe(models.Model):
     def __str__(self):
         return f'{self.name}, {self.author}'
 
+    @staticmethod
+    def make_content_hash(name, text, cooking_time):
+        """
+        Hash of the normalized name, text and cooking time.
+        Recipes that differ only in case or whitespace get the same hash.
+        """
+        normalized = '\x1f'.join((
+            ' '.join(name.split()).casefold(),
+            ' '.join(text.split()).casefold(),
+            str(int(cooking_time)),
+        ))
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    @staticmethod
+    def is_duplicate_error(error):
+        """
+        Whether the IntegrityError comes from the unique content hash.
+        """
+        diag = getattr(error.__cause__, 'diag', None)
+        if diag is not None:
+            return diag.constraint_name == CONTENT_HASH_CONSTRAINT
+        return 'content_hash' in str(error)
+
+    @staticmethod
+    def popularity_score(favorites, shopping_carts, pub_date):
+        """
+        Log of the weighted favorites and cart additions plus the age bonus.
+
+        Ordering by this score is the same as ordering by the weight
+        halved every POPULARITY_HALF_LIFE seconds of age, but the score
+        itself does not change with time, so it only has to be recounted
+        when favorites or carts of the recipe change.
+        """
+        weight = (FAVORITE_WEIGHT * favorites
+                  + SHOPPING_CART_WEIGHT * shopping_carts)
+        return (math.log2(1 + weight)
+                + pub_date.timestamp() / POPULARITY_HALF_LIFE)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.popularity = self.popularity_score(0, 0, timezone.now())
+        content_hash = self.make_content_hash(
+            self.name, self.text, self.cooking_time)
+        if (self.content_hash is None and not self._state.adding
+                and Recipe.objects.filter(content_hash=content_hash).exclude(
+                    pk=self.pk).exists()):
+            # An older duplicate left without a hash by migration 0002.
+            content_hash = None
+        self.content_hash = content_hash
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'],
+                                       'content_hash'}
+        super().save(*args, **kwargs)
+
+
+class RecipeTombstone(models.Model):
+    """
+    Trace of a deleted recipe for clients syncing the catalog.
+    """
+
+    recipe_id = models.BigIntegerField(
+        verbose_name='Recipe id'
+    )
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Deletion date'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('deleted_at', 'recipe_id'),
+                name='tombstone_deleted_idx'
+            ),
+        ]
+        verbose_name = 'Deleted recipe'
+        verbose_name_plural = 'Deleted recipes'
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id} deleted {self.deleted_at}'
+
 
 class IngredientInRecipe(models.Model):
     """
@@ -229,3 +359,51 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'{self.user.username} add'
                 f'{self.recipe.name} to shopping list.')
+
+
+class RecipeSignature(models.Model):
+    """
+    MinHash signature of the ingredients of a recipe.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Recipe',
+    )
+    minhash = models.BinaryField(
+        verbose_name='MinHash'
+    )
+
+    class Meta:
+        verbose_name = 'Recipe signature'
+        verbose_name_plural = 'Recipe signatures'
+
+    def __str__(self):
+        return f'Signature of recipe {self.recipe_id}'
+
+
+class RecipeBand(models.Model):
+    """
+    LSH band of a recipe signature, recipes sharing a band are candidates.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='bands',
+        verbose_name='Recipe',
+    )
+    band = models.BigIntegerField(
+        db_index=True,
+        verbose_name='Band hash'
+    )
+
+    class Meta:
+        verbose_name = 'Recipe band'
+        verbose_name_plural = 'Recipe bands'
+
+    def __str__(self):
+        return f'Band {self.band} of recipe {self.recipe_id}'
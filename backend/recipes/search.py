@@ -0,0 +1,139 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Upper
+
+SIMILARITY_THRESHOLD = 0.3
+MAX_QUERY_LENGTH = 100
+MAX_CANDIDATES = 1000
+
+WORD = re.compile(r'\w+')
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def trigrams(text):
+    """
+    Trigrams of every word padded like pg_trgm does it.
+    """
+    result = set()
+    for word in WORD.findall(text.casefold()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index of names, used where pg_trgm is missing.
+
+    Only meant for development and tests on SQLite: prefix and substring
+    matches scan every name. Other processes and bulk inserts rebuild it
+    through the revision given to get_index. Production runs on
+    PostgreSQL.
+    """
+
+    def __init__(self, rows):
+        self.names = {}
+        self.sizes = {}
+        self.postings = defaultdict(list)
+        for pk, name in rows:
+            grams = trigrams(name)
+            self.names[pk] = name.casefold()
+            self.sizes[pk] = len(grams)
+            for gram in grams:
+                self.postings[gram].append(pk)
+        self.by_name = sorted(self.names, key=self.names.get)
+
+    def search(self, value):
+        """
+        Primary keys of prefix matches, then of substring matches by name,
+        then of fuzzy matches by descending similarity.
+        """
+        value = value.casefold()
+        prefix = [pk for pk in self.by_name
+                  if self.names[pk].startswith(value)]
+        found = set(prefix)
+        substring = [pk for pk in self.by_name
+                     if pk not in found and value in self.names[pk]]
+        found.update(substring)
+        grams = trigrams(value)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        fuzzy = []
+        for pk, count in shared.items():
+            similarity = count / (len(grams) + self.sizes[pk] - count)
+            if pk not in found and similarity >= SIMILARITY_THRESHOLD:
+                fuzzy.append((-similarity, self.names[pk], pk))
+        fuzzy.sort()
+        return (prefix + substring
+                + [pk for _, _, pk in fuzzy])[:MAX_CANDIDATES]
+
+
+def get_index(model, field, revision=None):
+    """
+    Index of the field, rebuilt when the revision of the model changes.
+    """
+    key = (model, field)
+    with _lock:
+        if key not in _indexes or _indexes[key][0] != revision:
+            _indexes[key] = revision, TrigramIndex(
+                model._default_manager.values_list('pk', field).iterator())
+        return _indexes[key][1]
+
+
+def clear_indexes():
+    with _lock:
+        _indexes.clear()
+
+
+def invalidate_index(model):
+    with _lock:
+        for key in [key for key in _indexes if key[0] is model]:
+            del _indexes[key]
+
+
+def search_by_name(queryset, value, field='name', revision=None):
+    """
+    Filter by prefix, substring or trigram similarity of the field.
+
+    Prefix hits come first, then substring hits, then fuzzy ones.
+
+    PostgreSQL uses the pg_trgm GIN index over UPPER(field), other
+    databases use an in-memory TrigramIndex of the process, kept for
+    the revision of the model's namespace.
+    """
+    value = ' '.join(value.split())[:MAX_QUERY_LENGTH]
+    if not value:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_postgres(queryset, value, field)
+    ranked = get_index(queryset.model, field, revision).search(value)
+    return queryset.filter(pk__in=ranked).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ranked)),
+        output_field=IntegerField()))
+
+
+def search_postgres(queryset, value, field):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    value = value.upper()
+    is_prefix = Q(search_name__startswith=value)
+    is_substring = Q(search_name__contains=value)
+    return queryset.annotate(
+        search_name=Upper(field)
+    ).filter(
+        is_substring | Q(search_name__trigram_similar=value)
+    ).annotate(
+        match=Case(When(is_prefix, then=Value(0)),
+                   When(is_substring, then=Value(1)),
+                   default=Value(2),
+                   output_field=IntegerField()),
+        similarity=TrigramSimilarity(Upper(field), value),
+    ).order_by('match', '-similarity', field, 'pk')
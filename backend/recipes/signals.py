@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeTombstone,
+                            ShoppingCart)
+from recipes.search import invalidate_index
+
+recipes_created = Signal()
+ingredients_created = Signal()
+popularity_updated = Signal()
+recipes_deleted = Signal()
+users_deleted = Signal()
+
+
+def mark_popularity_stale(recipe_id):
+    Recipe.objects.filter(pk=recipe_id).update(popularity_stale=True)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_signals_changed(sender, instance, **kwargs):
+    mark_popularity_stale(instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(recipes_created)
+@receiver(ingredients_created)
+def names_changed(sender, **kwargs):
+    invalidate_index(sender)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    RecipeTombstone.objects.create(recipe_id=instance.pk)
+
+
+@receiver(recipes_deleted)
+def recipes_deleted_in_database(sender, recipe_ids, **kwargs):
+    """
+    Bookkeeping of recipes deleted without loading them.
+    """
+    RecipeTombstone.objects.bulk_create(
+        RecipeTombstone(recipe_id=pk) for pk in recipe_ids)
+    invalidate_index(Recipe)
@@ -0,0 +1,97 @@
+import hashlib
+import random
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import (IngredientInRecipe, Recipe, RecipeBand,
+                            RecipeSignature)
+
+NUM_PERMUTATIONS = 32
+BAND_ROWS = 2
+MAX_CANDIDATES = 500
+PRIME = (1 << 61) - 1
+
+_random = random.Random(20231027)
+PERMUTATIONS = tuple(
+    (_random.randrange(1, PRIME), _random.randrange(0, PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+)
+
+
+def minhash(ingredient_ids):
+    return [min((a * pk + b) % PRIME & 0xFFFFFFFF for pk in ingredient_ids)
+            for a, b in PERMUTATIONS]
+
+
+def band_keys(signature):
+    """
+    Signed 64-bit hashes of the bands, one per BAND_ROWS values.
+    """
+    keys = []
+    for start in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+        rows = array('I', signature[start:start + BAND_ROWS]).tobytes()
+        digest = hashlib.blake2b(bytes((start,)) + rows,
+                                 digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def load_signature(data):
+    return array('I', bytes(data)).tolist()
+
+
+def update_signatures(recipe_ids):
+    """
+    Rebuild signatures and bands of the given recipes.
+    """
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe', 'ingredient'):
+        ingredients[recipe_id].append(ingredient_id)
+    signatures = []
+    bands = []
+    for recipe_id, ingredient_ids in ingredients.items():
+        signature = minhash(ingredient_ids)
+        signatures.append(RecipeSignature(
+            recipe_id=recipe_id,
+            minhash=array('I', signature).tobytes()))
+        bands.extend(RecipeBand(recipe_id=recipe_id, band=key)
+                     for key in band_keys(signature))
+    with transaction.atomic():
+        RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeBand.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.bulk_create(signatures)
+        RecipeBand.objects.bulk_create(bands)
+
+
+def similar_recipes(recipe, limit):
+    """
+    Recipes with the closest ingredient sets, most similar first.
+
+    Candidates are the recipes sharing the most bands with the given one,
+    they are ranked by the share of equal MinHash values, which estimates
+    the Jaccard similarity of the ingredient sets.
+    """
+    try:
+        signature = load_signature(recipe.signature.minhash)
+    except RecipeSignature.DoesNotExist:
+        return []
+    candidates = RecipeBand.objects.filter(
+        band__in=band_keys(signature)
+    ).exclude(
+        recipe=recipe
+    ).values('recipe').annotate(
+        hits=Count('id')
+    ).order_by('-hits').values_list('recipe', flat=True)[:MAX_CANDIDATES]
+    scores = []
+    for other in RecipeSignature.objects.filter(recipe__in=list(candidates)):
+        other_signature = load_signature(other.minhash)
+        equal = sum(a == b for a, b in zip(signature, other_signature))
+        scores.append((equal, other.recipe_id))
+    scores.sort(key=lambda item: (-item[0], -item[1]))
+    ranked = [recipe_id for _, recipe_id in scores[:limit]]
+    recipes = Recipe.objects.in_bulk(ranked)
+    return [recipes[pk] for pk in ranked if pk in recipes]
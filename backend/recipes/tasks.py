@@ -0,0 +1,12 @@
+from recipes.similarity import update_signatures
+from tasks.queue import task
+
+
+@task(name='recipes.update_signature')
+def update_signature(recipe_id):
+    update_signatures([recipe_id])
+
+
+@task(name='recipes.update_signatures')
+def update_signature_batch(recipe_ids):
+    update_signatures(recipe_ids)
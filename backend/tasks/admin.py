@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from tasks.models import Task
+from tasks.queue import retry
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'args', 'status', 'run_at', 'attempts',
+                    'created_at',)
+    list_filter = ('status', 'name',)
+    search_fields = ('name', 'dedup_key',)
+    readonly_fields = ('locked_at', 'last_error', 'created_at',)
+    actions = ('retry_failed',)
+
+    @admin.action(description='Run selected failed tasks again')
+    def retry_failed(self, request, queryset):
+        for task in queryset.filter(status=Task.FAILED):
+            retry(task, attempts=0)
@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from tasks.queue import claim, release_stale, run
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks in a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            default=settings.TASK_WORKERS)
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.TASK_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no task is due.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.done = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.wait_for_database()
+        with ThreadPoolExecutor(options['threads']) as executor:
+            workers = [
+                executor.submit(self.work, options['poll_interval'],
+                                options['once'])
+                for _ in range(options['threads'])
+            ]
+            try:
+                wait(workers, return_when=FIRST_EXCEPTION)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.stop.set()
+        self.stdout.write(
+            f'Tasks done: {self.done}, failed: {self.failed}.')
+        for worker in workers:
+            worker.result()
+
+    def wait_for_database(self):
+        """
+        The workers may start before the database is up or migrated.
+        """
+        while True:
+            try:
+                release_stale()
+                return
+            except DatabaseError as error:
+                self.stderr.write(f'Database is not ready: {error}')
+                connection.close()
+                time.sleep(settings.TASK_STARTUP_RETRY_INTERVAL)
+
+    def work(self, poll_interval, once):
+        """
+        Loop of one worker thread with its own database connection.
+        """
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                task = claim()
+                if task is None:
+                    if once:
+                        return
+                    release_stale()
+                    self.stop.wait(poll_interval)
+                    continue
+                succeeded = run(task)
+                with self.lock:
+                    if succeeded:
+                        self.done += 1
+                    else:
+                        self.failed += 1
+        finally:
+            connection.close()
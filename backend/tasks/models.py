@@ -0,0 +1,85 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    Deferred call of a registered function, run by run_workers.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(
+        max_length=200,
+        verbose_name='Task name'
+    )
+    args = models.JSONField(
+        default=list,
+        verbose_name='Arguments'
+    )
+    dedup_key = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        verbose_name='Deduplication key'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Status'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Run not before'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Attempts'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name='Maximum attempts'
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Taken by a worker at'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Last error'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Creation date'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('dedup_key',),
+                condition=Q(status='pending'),
+                name='unique_pending_task'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('status', 'run_at'),
+                name='task_status_run_at_idx'
+            ),
+        ]
+        ordering = ('run_at', 'id')
+        verbose_name = 'Task'
+        verbose_name_plural = 'Tasks'
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)}'
@@ -0,0 +1,161 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class TaskFunction:
+    """
+    Function registered in the queue.
+
+    Calling it runs the work right away, enqueue() defers it to the
+    workers. Arguments are stored as JSON.
+    """
+
+    def __init__(self, function, name, max_attempts, retry_delay):
+        self.function = function
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+    def enqueue(self, *args, dedup_key=None, run_at=None, delay=None):
+        return enqueue(self.name, *args, dedup_key=dedup_key, run_at=run_at,
+                       delay=delay)
+
+
+def task(name=None, max_attempts=3, retry_delay=60):
+    """
+    Register a function as a task under its dotted path or the given name.
+    """
+    def register(function):
+        task_name = name or f'{function.__module__}.{function.__name__}'
+        TASKS[task_name] = TaskFunction(
+            function, task_name, max_attempts, retry_delay)
+        return TASKS[task_name]
+    return register
+
+
+def enqueue(name, *args, dedup_key=None, run_at=None, delay=None):
+    """
+    Put a call of the task into the queue.
+
+    Inside a transaction the task is committed or rolled back together
+    with the data it works on. While a task with the same dedup_key is
+    pending, another one is not added: the pending one will see the
+    latest data anyway.
+    """
+    if run_at is None:
+        run_at = timezone.now()
+    if delay is not None:
+        run_at += timedelta(seconds=delay)
+    Task.objects.bulk_create([Task(
+        name=name,
+        args=list(args),
+        dedup_key=dedup_key,
+        run_at=run_at,
+        max_attempts=TASKS[name].max_attempts,
+    )], ignore_conflicts=True)
+
+
+def claim():
+    """
+    Take the next due task or return None.
+
+    Where the database supports it, workers skip rows locked by each
+    other. Elsewhere the conditional update makes sure that only one of
+    them gets the task.
+    """
+    while True:
+        now = timezone.now()
+        due = Task.objects.filter(
+            status=Task.PENDING, run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                task = due.select_for_update(skip_locked=True).first()
+                claimed = task is not None and take(task, now)
+        else:
+            task = due.first()
+            claimed = task is not None and take(task, now)
+        if task is None:
+            return None
+        if claimed:
+            return task
+
+
+def take(task, now):
+    claimed = Task.objects.filter(pk=task.pk, status=Task.PENDING).update(
+        status=Task.RUNNING, locked_at=now, attempts=task.attempts + 1)
+    task.status = Task.RUNNING
+    task.attempts += 1
+    return claimed
+
+
+def retry(task, attempts=None, run_at=None, error=''):
+    """
+    Put the task back into the queue.
+
+    A pending task with the same dedup_key already covers it, so in that
+    case the task is dropped.
+    """
+    update = {
+        'status': Task.PENDING,
+        'run_at': run_at or timezone.now(),
+        'locked_at': None,
+        'last_error': error,
+    }
+    if attempts is not None:
+        update['attempts'] = attempts
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task.pk).update(**update)
+    except IntegrityError:
+        Task.objects.filter(pk=task.pk).delete()
+
+
+def run(task):
+    """
+    Run a claimed task.
+
+    Done tasks are deleted, failed ones are retried with an exponential
+    delay until max_attempts and then kept with the failed status.
+    """
+    function = TASKS.get(task.name)
+    try:
+        if function is None:
+            raise LookupError(f'Unknown task {task.name}.')
+        function(*task.args)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Task %s failed', task)
+        if function is not None and task.attempts < task.max_attempts:
+            delay = function.retry_delay * 2 ** (task.attempts - 1)
+            retry(task, run_at=timezone.now() + timedelta(seconds=delay),
+                  error=error)
+        else:
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.FAILED, locked_at=None, last_error=error)
+        return False
+    Task.objects.filter(pk=task.pk).delete()
+    return True
+
+
+def release_stale():
+    """
+    Return to the queue tasks of workers which died while running them.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=expired)
+    for task in stale:
+        retry(task)
@@ -0,0 +1,120 @@
+import base64
+import io
+
+import pytest
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.caching import ingredient_lists, recipe_counts, recipe_pages, tag_maps
+from recipes.models import Ingredient, Tag
+from recipes.search import clear_indexes
+from users.models import User
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+IMAGE = make_image()
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
+    settings.PROFILE_ROOT = str(tmp_path / 'profiles')
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher']
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    cache.clear()
+    for tiered in (recipe_pages, recipe_counts, ingredient_lists, tag_maps):
+        tiered.local.clear()
+    clear_indexes()
+
+
+def make_user(name):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.org', password='Pass-word-1',
+        first_name=name, last_name=name)
+
+
+def make_client(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def admin_client(client, db):
+    client.force_login(User.objects.create_superuser(
+        'admin', 'admin@example.org', 'Pass-word-1',
+        first_name='admin', last_name='admin'))
+    return client
+
+
+@pytest.fixture
+def user(db):
+    return make_user('reader')
+
+
+@pytest.fixture
+def author(db):
+    return make_user('author')
+
+
+@pytest.fixture
+def user_client(user):
+    return make_client(user)
+
+
+@pytest.fixture
+def author_client(author):
+    return make_client(author)
+
+
+@pytest.fixture
+def tags(db):
+    return [Tag.objects.create(name=f'Tag {number}', slug=f'tag{number}',
+                               color=f'#00000{number}')
+            for number in range(3)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('salt', 'sugar', 'flour', 'milk')]
+
+
+@pytest.fixture
+def recipe_data(tags, ingredients):
+    def make(name='Soup', **fields):
+        data = {
+            'name': name,
+            'text': f'{name} text',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [tags[0].id],
+            'ingredients': [{'id': ingredients[0].id, 'amount': 5},
+                            {'id': ingredients[1].id, 'amount': 2}],
+        }
+        data.update(fields)
+        return data
+    return make
+
+
+@pytest.fixture
+def create_recipe(author_client, recipe_data):
+    def create(name='Soup', client=None, **fields):
+        response = (client or author_client).post(
+            '/api/recipes/', recipe_data(name, **fields), format='json')
+        assert response.status_code == 201, response.content
+        return response.json()['id']
+    return create
@@ -0,0 +1,38 @@
+import pytest
+
+from recipes.models import Favorite, IngredientInRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+CHANGELISTS = (
+    '/admin/recipes/recipe/',
+    '/admin/recipes/favorite/',
+    '/admin/recipes/shoppingcart/',
+    '/admin/recipes/ingredientinrecipe/',
+    '/admin/users/user/',
+    '/admin/users/follow/',
+)
+
+
+@pytest.fixture
+def rows(author, tags, ingredients):
+    for number in range(20):
+        user = User.objects.create_user(
+            f'user{number}', f'user{number}@example.org', 'Pass-word-1',
+            first_name='user', last_name='user')
+        recipe = Recipe.objects.create(
+            author=user, name=f'Soup {number}', text='text',
+            cooking_time=5, image='recipes/media/soup.png')
+        recipe.tags.set(tags)
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=ingredients[0], amount=1)
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        Follow.objects.create(user=user, author=author)
+
+
+@pytest.mark.parametrize('url', CHANGELISTS)
+def test_changelist_queries_do_not_grow(url, admin_client, rows,
+                                        django_assert_max_num_queries):
+    with django_assert_max_num_queries(7):
+        response = admin_client.get(url)
+    assert response.status_code == 200
@@ -0,0 +1,47 @@
+import pytest
+from django.db import IntegrityError
+
+from api import bulk
+from recipes.models import IngredientInRecipe, Recipe
+from tests.test_duplicates import media_files
+
+URL = '/api/recipes/bulk/'
+
+
+def test_bulk_creates_recipes(author_client, recipe_data):
+    response = author_client.post(
+        URL, [recipe_data('Soup'), recipe_data('Stew')], format='json')
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json()['results']] == [
+        bulk.CREATED, bulk.CREATED]
+    assert Recipe.objects.count() == 2
+
+
+def test_concurrent_duplicate_fails_only_its_item(
+        create_recipe, author_client, recipe_data, monkeypatch):
+    create_recipe('Soup')
+    images = media_files()
+    monkeypatch.setattr(bulk, 'existing_hashes', lambda hashes: ())
+    response = author_client.post(
+        URL, [recipe_data('Stew'), recipe_data('Soup'), recipe_data('Pie')],
+        format='json')
+    results = response.json()['results']
+    assert [result['status'] for result in results] == [
+        bulk.CREATED, bulk.FAILED, bulk.CREATED]
+    assert results[1]['errors'] == {
+        'non_field_errors': ['Recipe already exist.']}
+    assert set(Recipe.objects.values_list('name', flat=True)) == {
+        'Soup', 'Stew', 'Pie'}
+    assert len(media_files()) == len(images) + 2
+
+
+def test_other_integrity_errors_are_raised(author_client, recipe_data,
+                                           monkeypatch):
+    def fail(*args, **kwargs):
+        raise IntegrityError('null value in column "amount"')
+
+    monkeypatch.setattr(IngredientInRecipe.objects, 'bulk_create', fail)
+    with pytest.raises(IntegrityError):
+        author_client.post(URL, [recipe_data('Soup')], format='json')
+    assert media_files() == []
+    assert not Recipe.objects.exists()
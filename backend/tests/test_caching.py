@@ -0,0 +1,42 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+
+from api.caching import TieredCache
+
+
+def test_processes_compute_a_value_once(settings):
+    settings.CACHE_LOCK_POLL_INTERVAL = 0.01
+    processes = [TieredCache('test') for _ in range(4)]
+    started = threading.Barrier(len(processes))
+    calls = []
+
+    def produce():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'value'
+
+    def get(tiered):
+        started.wait()
+        return tiered.get_or_set('key', produce)
+
+    with ThreadPoolExecutor(len(processes)) as executor:
+        values = list(executor.map(get, processes))
+    assert values == ['value'] * len(processes)
+    assert len(calls) == 1
+
+
+def test_lock_is_released_after_failure():
+    tiered = TieredCache('test')
+
+    def fail():
+        raise RuntimeError
+
+    try:
+        tiered.get_or_set('key', fail)
+    except RuntimeError:
+        pass
+    assert cache.get(f'lock:{tiered.make_key("key")}') is None
+    assert tiered.get_or_set('key', lambda: 'value') == 'value'
@@ -0,0 +1,24 @@
+def test_retrieve_unknown_or_invalid_recipe(user_client, db):
+    assert user_client.get('/api/recipes/abc/').status_code == 404
+    assert user_client.get('/api/recipes/999/').status_code == 404
+
+
+def test_etag_changes_with_every_edit(transactional_db, create_recipe,
+                                      author_client, recipe_data):
+    recipe = create_recipe()
+    url = f'/api/recipes/{recipe}/'
+    response = author_client.get(url)
+    etag = response['ETag']
+    assert author_client.get(
+        url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    etags = {etag}
+    for name in ('Stew', 'Broth'):
+        data = recipe_data(name)
+        del data['image']
+        author_client.patch(url, data, format='json')
+        response = author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()['name'] == name
+        etag = response['ETag']
+        etags.add(etag)
+    assert len(etags) == 3
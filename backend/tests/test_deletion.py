@@ -0,0 +1,124 @@
+import os
+
+import pytest
+from django.contrib.admin import site
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+from api import revisions
+from recipes.deletion import (database_cascades, delete_recipes, delete_users,
+                              fast_delete_supported)
+from recipes.models import Favorite, IngredientInRecipe, Recipe, ShoppingCart
+from tests.conftest import make_user
+from users.models import Follow, User
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='foreign keys cascade in the database only on PostgreSQL')
+
+
+def on_delete(table, column):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT confdeltype FROM pg_constraint '
+            'WHERE conrelid = %s::regclass AND contype = %s '
+            'AND conkey[1] = (SELECT attnum FROM pg_attribute '
+            'WHERE attrelid = %s::regclass AND attname = %s)',
+            [table, 'f', table, column])
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cascade_check():
+    database_cascades.cache_clear()
+    yield
+    database_cascades.cache_clear()
+
+
+def test_only_own_tables_cascade(db):
+    assert on_delete(Favorite._meta.db_table, 'recipe_id') == 'c'
+    assert on_delete(Follow._meta.db_table, 'author_id') == 'c'
+    assert on_delete(User.groups.through._meta.db_table, 'user_id') == 'c'
+    assert on_delete(Token._meta.db_table, 'user_id') == 'a'
+    assert on_delete(LogEntry._meta.db_table, 'user_id') == 'a'
+
+
+def test_delete_recipes_cascades(transactional_db, create_recipe, user,
+                                 settings):
+    recipe = Recipe.objects.get(pk=create_recipe())
+    image = os.path.join(settings.MEDIA_ROOT, recipe.image.name)
+    Favorite.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    favorites = revisions.get_revision(revisions.FAVORITES, user.pk)
+    cart = revisions.get_revision(revisions.SHOPPING_CART, user.pk)
+    assert delete_recipes([recipe.pk]) == 1
+    assert not Recipe.objects.exists()
+    assert not Favorite.objects.exists()
+    assert not ShoppingCart.objects.exists()
+    assert not IngredientInRecipe.objects.exists()
+    assert not os.path.exists(image)
+    assert revisions.get_revision(revisions.FAVORITES, user.pk) > favorites
+    assert revisions.get_revision(
+        revisions.SHOPPING_CART, user.pk) > cart
+
+
+def test_delete_users_cascades(transactional_db, create_recipe, author,
+                               user):
+    other = make_user('other')
+    Token.objects.create(user=user)
+    recipe = Recipe.objects.get(pk=create_recipe())
+    Favorite.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    Follow.objects.create(user=user, author=author)
+    Follow.objects.create(user=author, author=other)
+    LogEntry.objects.log_action(author.pk, None, None, 'x', ADDITION)
+    follows = revisions.get_revision(revisions.FOLLOWS, user.pk)
+    favorites = revisions.get_revision(revisions.FAVORITES, user.pk)
+    assert fast_delete_supported()
+    assert delete_users([author.pk]) == 1
+    assert not User.objects.filter(pk=author.pk).exists()
+    assert not Recipe.objects.exists()
+    assert not Favorite.objects.exists()
+    assert not ShoppingCart.objects.exists()
+    assert not Follow.objects.exists()
+    assert not Token.objects.filter(user_id=author.pk).exists()
+    assert not LogEntry.objects.exists()
+    assert Token.objects.filter(user=user).exists()
+    assert revisions.get_revision(revisions.FOLLOWS, user.pk) > follows
+    assert revisions.get_revision(revisions.FAVORITES, user.pk) > favorites
+
+
+def test_delete_confirmation_loads_authors_at_once(
+        admin_client, create_recipe, django_assert_num_queries):
+    for number in range(10):
+        create_recipe(f'Soup {number}')
+    request = RequestFactory().post('/admin/recipes/recipe/')
+    request.user = User.objects.get(username='admin')
+    assert fast_delete_supported()
+    with django_assert_num_queries(1):
+        objects, *_ = site._registry[Recipe].get_deleted_objects(
+            Recipe.objects.all(), request)
+    assert len(objects) == 10
+
+
+def test_missing_cascade_falls_back_to_django(create_recipe, user):
+    recipe = create_recipe()
+    table = Favorite._meta.db_table
+    with connection.cursor() as cursor:
+        name, = [name for name, constraint in
+                 connection.introspection.get_constraints(
+                     cursor, table).items()
+                 if constraint['foreign_key']
+                 and constraint['columns'] == ['recipe_id']]
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(
+            f'ALTER TABLE {table} DROP CONSTRAINT {name}, '
+            f'ADD CONSTRAINT {name} FOREIGN KEY (recipe_id) '
+            f'REFERENCES {Recipe._meta.db_table} (id) '
+            'DEFERRABLE INITIALLY DEFERRED')
+    Favorite.objects.create(user=user, recipe_id=recipe)
+    assert not fast_delete_supported()
+    assert delete_recipes([recipe]) == 1
+    assert not Favorite.objects.exists()
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from api.serializers import RecipeCreateSerializer
+from recipes.models import Ingredient, Recipe
+
+
+def media_files():
+    return sorted(
+        name for _, _, names in os.walk(settings.MEDIA_ROOT) for name in names)
+
+
+def test_duplicate_recipe_is_rejected(create_recipe, author_client,
+                                      recipe_data):
+    create_recipe()
+    response = author_client.post(
+        '/api/recipes/', recipe_data(), format='json')
+    assert response.status_code == 400
+    assert response.json() == ['Recipe already exist.']
+
+
+def test_is_duplicate_error(create_recipe, ingredients):
+    first = Recipe.objects.get(pk=create_recipe('Soup'))
+    second = create_recipe('Stew')
+    with pytest.raises(IntegrityError) as duplicate, transaction.atomic():
+        Recipe.objects.filter(pk=second).update(
+            content_hash=first.content_hash)
+    assert Recipe.is_duplicate_error(duplicate.value)
+    with pytest.raises(IntegrityError) as other, transaction.atomic():
+        Ingredient.objects.create(name=ingredients[0].name,
+                                  measurement_unit='g')
+    assert not Recipe.is_duplicate_error(other.value)
+
+
+def test_unrelated_integrity_error_is_raised(author_client, recipe_data,
+                                             monkeypatch):
+    def fail(*args, **kwargs):
+        raise IntegrityError('another constraint')
+
+    monkeypatch.setattr('api.serializers.update_signature.enqueue', fail)
+    with pytest.raises(IntegrityError):
+        author_client.post('/api/recipes/', recipe_data(), format='json')
+    assert media_files() == []
+
+
+def test_failed_update_deletes_new_image(create_recipe, author_client,
+                                         recipe_data, monkeypatch):
+    create_recipe('Soup')
+    second = create_recipe('Stew')
+    images = media_files()
+    monkeypatch.setattr(RecipeCreateSerializer, 'check_duplicate',
+                        lambda *args: None)
+    response = author_client.patch(
+        f'/api/recipes/{second}/', recipe_data('Soup'), format='json')
+    assert response.status_code == 400
+    assert media_files() == images
+
+
+def test_older_duplicate_can_be_edited(create_recipe, author_client,
+                                       recipe_data, tags):
+    first = Recipe.objects.get(pk=create_recipe('Soup'))
+    second = create_recipe('Stew')
+    Recipe.objects.filter(pk=second).update(
+        name=first.name, text=first.text, content_hash=None)
+    recipe = Recipe.objects.get(pk=second)
+    recipe.save()
+    assert recipe.content_hash is None
+    data = recipe_data('Soup', tags=[tags[1].id])
+    del data['image']
+    response = author_client.patch(
+        f'/api/recipes/{second}/', data, format='json')
+    assert response.status_code == 200
@@ -0,0 +1,42 @@
+import asyncio
+
+from rest_framework.authtoken.models import Token
+
+from api import events
+
+URL = '/api/recipes/event_ticket/'
+
+
+def scope(query=b'', headers=()):
+    return {'type': 'http', 'method': 'GET', 'path': events.EVENTS_PATH,
+            'query_string': query, 'headers': list(headers)}
+
+
+def test_ticket_opens_one_stream(user, user_client):
+    ticket = user_client.post(URL).json()['ticket']
+    assert events.load_user(scope(f'ticket={ticket}'.encode())) == user
+    assert events.load_user(scope(f'ticket={ticket}'.encode())) is None
+
+
+def test_ticket_requires_authentication(client, db):
+    assert client.post(URL).status_code == 401
+
+
+def test_token_is_not_accepted_in_query(user, user_client):
+    key = Token.objects.get(user=user).key
+    assert events.load_user(scope(f'token={key}'.encode())) is None
+    assert events.load_user(scope(headers=[
+        (b'authorization', f'Token {key}'.encode())])) == user
+
+
+def test_database_calls_close_old_connections(monkeypatch):
+    calls = []
+    monkeypatch.setattr(events, 'close_old_connections',
+                        lambda: calls.append('close'))
+
+    def query():
+        calls.append('query')
+        return 1
+
+    assert asyncio.run(events.database_sync_to_async(query)()) == 1
+    assert calls == ['close', 'query', 'close']
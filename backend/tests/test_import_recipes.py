@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Recipe
+from tests.conftest import IMAGE
+from tests.test_duplicates import media_files
+
+
+@pytest.fixture
+def export_file(tmp_path, author, tags):
+    path = tmp_path / 'recipes.ndjson'
+    path.write_text(json.dumps({
+        'author': author.email,
+        'name': 'Soup',
+        'text': 'Soup text',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'pub_date': '2023-01-01T00:00:00+00:00',
+        'tags': [tags[0].slug],
+        'ingredients': [
+            {'name': 'salt', 'measurement_unit': 'g', 'amount': 5}],
+    }) + '\n', encoding='utf-8')
+    return path
+
+
+def test_import_recipes(export_file):
+    call_command('import_recipes', str(export_file))
+    assert Recipe.objects.get().ingredients.get().name == 'salt'
+    assert len(media_files()) == 1
+
+
+def test_rolled_back_batch_leaves_no_images(export_file, monkeypatch):
+    def fail(pks):
+        raise RuntimeError('signatures failed')
+
+    monkeypatch.setattr(
+        'recipes.management.commands.import_recipes.update_signatures', fail)
+    with pytest.raises(RuntimeError):
+        call_command('import_recipes', str(export_file))
+    assert not Recipe.objects.exists()
+    assert media_files() == []
+
+
+def test_import_changes_cached_lists(transactional_db, export_file,
+                                     user_client):
+    recipes = user_client.get('/api/recipes/')
+    ingredients = user_client.get('/api/ingredients/?name=pepp')
+    assert recipes.json()['count'] == 0
+    assert ingredients.json() == []
+    data = json.loads(export_file.read_text())
+    data['ingredients'].append(
+        {'name': 'pepper', 'measurement_unit': 'g', 'amount': 1})
+    export_file.write_text(json.dumps(data) + '\n', encoding='utf-8')
+    call_command('import_recipes', str(export_file))
+    response = user_client.get(
+        '/api/recipes/', HTTP_IF_NONE_MATCH=recipes['ETag'])
+    assert response.status_code == 200
+    assert response.json()['count'] == 1
+    assert [ingredient['name'] for ingredient in user_client.get(
+        '/api/ingredients/?name=pepp').json()] == ['pepper']
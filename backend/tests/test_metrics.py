@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from django.core.management import call_command
+
+from api import metrics
+
+
+@pytest.fixture
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics.registry, 'enabled', True)
+    monkeypatch.setattr(metrics.registry, 'path', None)
+
+
+def write_snapshot(settings, pid, value):
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, f'{pid}-test.json')
+    with open(path, 'w') as file:
+        json.dump([[metrics.COUNTER, 'foodgram_db_queries_total',
+                    [['action', 'list'], ['view', 'RecipeViewSet']], value]],
+                  file)
+    return path
+
+
+def queries(counters):
+    return counters['foodgram_db_queries_total',
+                    (('action', 'list'), ('view', 'RecipeViewSet'))]
+
+
+def test_collect_folds_exited_processes(settings, exited_pid):
+    first = write_snapshot(settings, exited_pid, 2)
+    running = write_snapshot(settings, os.getpid(), 3)
+    assert queries(metrics.collect()[0]) == 5
+    assert not os.path.exists(first)
+    assert os.path.exists(running)
+    second = write_snapshot(settings, exited_pid + 1000000, 4)
+    assert queries(metrics.collect()[0]) == 9
+    assert not os.path.exists(second)
+    assert set(os.listdir(settings.METRICS_DIR)) == {
+        metrics.EXITED, os.path.basename(running), metrics.LOCK}
+
+
+def test_collect_does_not_count_undeleted_snapshots_twice(
+        settings, exited_pid, monkeypatch):
+    path = write_snapshot(settings, exited_pid, 2)
+    monkeypatch.setattr(metrics.os, 'remove', lambda path: None)
+    assert queries(metrics.collect()[0]) == 2
+    assert queries(metrics.collect()[0]) == 2
+    assert os.path.exists(path)
+
+
+def test_flush_writes_only_when_enabled(settings):
+    metrics.inc('foodgram_db_queries_total', view='v', action='a')
+    metrics.registry.flush(force=True)
+    assert not os.path.isdir(settings.METRICS_DIR)
+
+
+def test_management_commands_do_not_write(db, settings):
+    call_command('update_popularity')
+    metrics.flush_on_exit()
+    assert not os.path.isdir(settings.METRICS_DIR)
+
+
+def test_flush_when_enabled(settings, enabled):
+    metrics.inc('foodgram_db_queries_total', view='v', action='a')
+    metrics.registry.flush(force=True)
+    counters, _ = metrics.collect()
+    assert counters['foodgram_db_queries_total',
+                    (('action', 'a'), ('view', 'v'))] >= 1
+
+
+def test_applications_enable_metrics_without_settings_variable():
+    env = {name: value for name, value in os.environ.items()
+           if name != 'DJANGO_SETTINGS_MODULE'}
+    for module in ('foodgram_backend.wsgi', 'foodgram_backend.asgi'):
+        result = subprocess.run(
+            [sys.executable, '-c',
+             f'import {module}; from api.metrics import registry; '
+             'print(registry.enabled)'],
+            env=env, capture_output=True, text=True)
+        assert result.stdout.strip() == 'True', result.stderr
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'ids', {'ids': 5}, {}])
+def test_lookup_rejects_bodies_without_id_list(body, user_client):
+    response = user_client.post('/api/recipes/lookup/', body, format='json')
+    assert response.status_code == 400
+
+
+def test_lookup_keeps_requested_order(create_recipe, user_client):
+    first = create_recipe('Soup')
+    second = create_recipe('Stew')
+    response = user_client.post(
+        '/api/recipes/lookup/', {'ids': [second, 999, first, second]},
+        format='json')
+    assert [recipe['id'] for recipe in response.json()] == [second, first]
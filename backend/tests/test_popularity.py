@@ -0,0 +1,47 @@
+import pytest
+from django.core.management import call_command
+
+from api import revisions
+from recipes.models import Recipe
+
+
+def test_update_popularity_changes_recipe_pages(transactional_db,
+                                                create_recipe, user_client):
+    create_recipe()
+    call_command('update_popularity')
+    etag = user_client.get('/api/recipes/')['ETag']
+    assert user_client.get(
+        '/api/recipes/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+    Recipe.objects.update(popularity_stale=True)
+    call_command('update_popularity')
+    assert user_client.get(
+        '/api/recipes/', HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_nothing_to_update_keeps_revision(transactional_db, create_recipe):
+    create_recipe()
+    call_command('update_popularity')
+    revision = revisions.get_revision(revisions.RECIPES)
+    call_command('update_popularity')
+    assert revisions.get_revision(revisions.RECIPES) == revision
+
+
+def test_failed_recount_leaves_recipes_stale(db, create_recipe,
+                                             monkeypatch):
+    create_recipe()
+    Recipe.objects.update(popularity_stale=True)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('recount failed')
+
+    monkeypatch.setattr(Recipe.objects, 'bulk_update', fail)
+    with pytest.raises(RuntimeError):
+        call_command('update_popularity')
+    assert Recipe.objects.get().popularity_stale
+
+
+def test_recount_clears_stale_flag(db, create_recipe):
+    create_recipe()
+    Recipe.objects.update(popularity_stale=True)
+    call_command('update_popularity')
+    assert not Recipe.objects.filter(popularity_stale=True).exists()
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from django.test import Client
+
+from tests.conftest import make_client, make_user
+
+
+@pytest.fixture
+def staff_client(db):
+    staff = make_user('staff')
+    staff.is_staff = True
+    staff.save()
+    return make_client(staff)
+
+
+def reports(settings):
+    if not os.path.isdir(settings.PROFILE_ROOT):
+        return []
+    return sorted(name for name in os.listdir(settings.PROFILE_ROOT)
+                  if name.endswith('.txt'))
+
+
+def test_profiled_request_writes_report(staff_client, settings):
+    response = staff_client.get('/api/tags/?profile=1')
+    name = response['X-Profile-Id']
+    assert reports(settings) == [f'{name}.txt']
+    assert os.path.exists(os.path.join(settings.PROFILE_ROOT, f'{name}.prof'))
+    with open(os.path.join(settings.PROFILE_ROOT, f'{name}.txt')) as file:
+        assert file.readline().strip() == 'GET /api/tags/?profile=1'
+
+
+def test_only_staff_is_profiled(user_client, settings):
+    response = user_client.get('/api/tags/', HTTP_X_PROFILE='1')
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response
+    assert reports(settings) == []
+
+
+def test_reports_are_bounded(staff_client, settings):
+    settings.PROFILE_MAX_REPORTS = 2
+    names = [staff_client.get('/api/tags/', HTTP_X_PROFILE='1')[
+        'X-Profile-Id'] for _ in range(4)]
+    assert reports(settings) == [f'{name}.txt' for name in names[2:]]
+    assert len(os.listdir(settings.PROFILE_ROOT)) == 4
+
+
+def test_admin_views_need_staff(user, admin_client, staff_client):
+    name = staff_client.get('/api/tags/?profile=1')['X-Profile-Id']
+    client = Client()
+    client.force_login(user)
+    for url in ('/admin/profiles/', f'/admin/profiles/{name}/'):
+        response = client.get(url)
+        assert response.status_code == 302
+        assert response['Location'].startswith('/admin/login/')
+    response = admin_client.get('/admin/profiles/')
+    assert response.status_code == 200
+    assert name in response.content.decode()
+    assert admin_client.get(f'/admin/profiles/{name}/').status_code == 200
+    assert admin_client.get('/admin/profiles/../x/').status_code == 404
@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.querylog import QueryLogMiddleware
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='statement_timeout exists only on PostgreSQL')
+
+
+def show_timeout():
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW statement_timeout')
+        return cursor.fetchone()[0]
+
+
+def view():
+    pass
+
+
+def run(get_response, view_name=None):
+    """
+    Pass a request through the middleware, resolving view_name if given.
+    """
+    def respond(request):
+        if view_name is not None:
+            middleware.process_view(request, view, (), {})
+        get_response()
+        return HttpResponse()
+
+    view.__name__ = view_name or 'view'
+    middleware = QueryLogMiddleware(respond)
+    middleware(RequestFactory().get('/'))
+
+
+def test_timeout_survives_rolled_back_first_query(transactional_db,
+                                                  settings):
+    settings.STATEMENT_TIMEOUTS = {'slow_view.get': 9000}
+    seen = []
+
+    def rolled_back():
+        try:
+            with transaction.atomic():
+                seen.append(show_timeout())
+                raise ValueError
+        except ValueError:
+            pass
+        seen.append(show_timeout())
+
+    run(rolled_back, 'slow_view')
+    assert seen == ['9s', '9s']
+
+
+def test_unresolved_request_gets_default_timeout(transactional_db,
+                                                 settings):
+    settings.STATEMENT_TIMEOUT = 4000
+    settings.STATEMENT_TIMEOUTS = {'slow_view.get': 9000}
+    seen = []
+    run(lambda: seen.append(show_timeout()), 'slow_view')
+    run(lambda: seen.append(show_timeout()))
+    assert seen == ['9s', '4s']
@@ -0,0 +1,54 @@
+import pytest
+
+from api.serializers import RecipeCreateSerializer
+
+
+@pytest.mark.parametrize('count', [1, 4])
+def test_ingredients_and_tags_take_one_query_each(
+        recipe_data, tags, ingredients, django_assert_num_queries, count):
+    data = recipe_data(
+        tags=[tag.id for tag in tags][:count],
+        ingredients=[{'id': ingredient.id, 'amount': 1}
+                     for ingredient in ingredients][:count])
+    serializer = RecipeCreateSerializer(data=data)
+    with django_assert_num_queries(2):
+        assert serializer.is_valid(), serializer.errors
+    assert serializer.validated_data['tags'] == tags[:count]
+    assert [item['ingredient'] for item in serializer.validated_data[
+        'ingredients']] == ingredients[:count]
+
+
+def test_known_objects_need_no_queries(recipe_data, tags, ingredients,
+                                       django_assert_num_queries):
+    serializer = RecipeCreateSerializer(data=recipe_data(), context={
+        'tag_map': {tag.id: tag for tag in tags},
+        'ingredient_map': {item.id: item for item in ingredients}})
+    with django_assert_num_queries(0):
+        assert serializer.is_valid(), serializer.errors
+
+
+def test_all_unknown_ids_are_reported(author_client, recipe_data, tags,
+                                      ingredients):
+    response = author_client.post('/api/recipes/', recipe_data(
+        tags=[998, tags[0].id, 999],
+        ingredients=[{'id': 997, 'amount': 1},
+                     {'id': ingredients[0].id, 'amount': 1},
+                     {'id': 996, 'amount': 1}]), format='json')
+    assert response.status_code == 400
+    assert response.json() == {
+        'ingredients': ['Ingredients not found: 997, 996.'],
+        'tags': ['Tags not found: 998, 999.'],
+    }
+
+
+def test_repeated_ids_are_rejected(author_client, recipe_data, tags,
+                                   ingredients):
+    response = author_client.post('/api/recipes/', recipe_data(
+        tags=[tags[0].id, tags[0].id],
+        ingredients=[{'id': ingredients[0].id, 'amount': 1},
+                     {'id': ingredients[0].id, 'amount': 2}]), format='json')
+    assert response.status_code == 400
+    assert response.json() == {
+        'ingredients': ['Need unique ingredients.'],
+        'tags': ['Need unique tags.'],
+    }
@@ -0,0 +1,31 @@
+import pytest
+from django.db import transaction
+
+from api import revisions
+
+
+def test_touch_waits_for_commit(transactional_db):
+    before = revisions.get_revision(revisions.RECIPES)
+    with transaction.atomic():
+        revisions.touch(revisions.RECIPES)
+        assert revisions.get_revision(revisions.RECIPES) == before
+    assert revisions.get_revision(revisions.RECIPES) > before
+
+
+def test_rolled_back_touch_keeps_revision(transactional_db):
+    before = revisions.get_revision(revisions.FAVORITES, 1)
+    with pytest.raises(RuntimeError), transaction.atomic():
+        revisions.touch(revisions.FAVORITES, 1)
+        raise RuntimeError
+    assert revisions.get_revision(revisions.FAVORITES, 1) == before
+
+
+def test_favorite_changes_list_after_commit(transactional_db, create_recipe,
+                                            user_client):
+    recipe = create_recipe()
+    url = '/api/recipes/?is_favorited=1'
+    assert user_client.get(url).json()['count'] == 0
+    user_client.post(f'/api/recipes/{recipe}/favorite/')
+    assert user_client.get(url).json()['count'] == 1
+    user_client.delete(f'/api/recipes/{recipe}/favorite/')
+    assert user_client.get(url).json()['count'] == 0
@@ -0,0 +1,45 @@
+from api import revisions
+from recipes.models import Ingredient
+from recipes.search import get_index
+
+
+def test_ingredient_detail_with_name_filter(user_client, ingredients):
+    response = user_client.get(
+        f'/api/ingredients/{ingredients[0].id}/?name=sa')
+    assert response.status_code == 200
+    assert response.json()['name'] == 'salt'
+
+
+def test_ingredient_search_is_limited(user_client, db, monkeypatch):
+    monkeypatch.setattr('api.views.INGREDIENT_SEARCH_LIMIT', 2)
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'salt {number}', measurement_unit='g')
+        for number in range(5))
+    assert len(user_client.get('/api/ingredients/?name=salt').json()) == 2
+    assert len(user_client.get('/api/ingredients/').json()) == 5
+
+
+def test_ingredient_search_ranks_prefix_first(user_client, db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='g')
+        for name in ('sea salt', 'salt', 'salami'))
+    names = [ingredient['name'] for ingredient in user_client.get(
+        '/api/ingredients/?name=sal').json()]
+    assert set(names[:2]) == {'salami', 'salt'}
+    assert 'sea salt' in names
+
+
+def test_index_follows_ingredient_revision(user_client, ingredients):
+    url = '/api/ingredients/?name=pepper'
+    assert user_client.get(url).json() == []
+    Ingredient.objects.bulk_create(
+        [Ingredient(name='pepper', measurement_unit='g')])
+    revisions.bump(revisions.INGREDIENTS)
+    assert [ingredient['name'] for ingredient in
+            user_client.get(url).json()] == ['pepper']
+
+
+def test_index_is_rebuilt_for_a_new_revision(ingredients):
+    index = get_index(Ingredient, 'name', 1)
+    assert get_index(Ingredient, 'name', 1) is index
+    assert get_index(Ingredient, 'name', 2) is not index
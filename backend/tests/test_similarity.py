@@ -0,0 +1,61 @@
+import pytest
+
+from recipes.models import Ingredient
+from recipes.similarity import band_keys, minhash
+from tasks import queue
+from tasks.models import Task
+
+
+@pytest.fixture
+def pantry(db):
+    return [Ingredient.objects.create(name=f'spice {number}',
+                                      measurement_unit='g')
+            for number in range(30)]
+
+
+def run_tasks():
+    while True:
+        task = queue.claim()
+        if task is None:
+            return
+        queue.run(task)
+
+
+def items(ingredients):
+    return [{'id': ingredient.id, 'amount': 1} for ingredient in ingredients]
+
+
+def test_near_duplicates_share_a_band():
+    base = list(range(1, 11))
+    near = base[:9] + [11]
+    unrelated = list(range(100, 110))
+    bands = set(band_keys(minhash(base)))
+    assert bands & set(band_keys(minhash(near)))
+    assert not bands & set(band_keys(minhash(unrelated)))
+
+
+def test_similar_recipes(create_recipe, author_client, pantry):
+    soup = create_recipe('Soup', ingredients=items(pantry[:10]))
+    stew = create_recipe('Stew', ingredients=items(pantry[:9] + pantry[10:11]))
+    create_recipe('Cake', ingredients=items(pantry[20:30]))
+    run_tasks()
+    response = author_client.get(f'/api/recipes/{soup}/similar/')
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.json()] == [stew]
+
+
+def test_edit_updates_signature(create_recipe, author_client, recipe_data,
+                                pantry):
+    soup = create_recipe('Soup', ingredients=items(pantry[:10]))
+    cake = create_recipe('Cake', ingredients=items(pantry[20:30]))
+    run_tasks()
+    assert author_client.get(f'/api/recipes/{soup}/similar/').json() == []
+    data = recipe_data('Cake', ingredients=items(pantry[:10]))
+    del data['image']
+    author_client.patch(f'/api/recipes/{cake}/', data, format='json')
+    assert Task.objects.filter(
+        name='recipes.update_signature', args=[cake],
+        status=Task.PENDING).exists()
+    run_tasks()
+    assert [recipe['id'] for recipe in author_client.get(
+        f'/api/recipes/{soup}/similar/').json()] == [cake]
@@ -0,0 +1,63 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def get_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200, response.content
+    return response.json(), [query['sql'] for query in queries]
+
+
+def test_fields_leaves_listed_fields(create_recipe, user_client):
+    recipe_id = create_recipe('Soup')
+    response = user_client.get('/api/recipes/?fields=id,name')
+    assert response.json()['results'] == [{'id': recipe_id, 'name': 'Soup'}]
+    response = user_client.get(f'/api/recipes/{recipe_id}/?fields=name')
+    assert response.json() == {'name': 'Soup'}
+
+
+def test_omit_drops_listed_fields(create_recipe, user_client):
+    create_recipe('Soup')
+    full = user_client.get('/api/recipes/').json()['results'][0]
+    data = user_client.get(
+        '/api/recipes/?omit=text,ingredients').json()['results'][0]
+    assert set(data) == set(full) - {'text', 'ingredients'}
+    assert data == {name: value for name, value in full.items()
+                    if name in data}
+
+
+def test_fields_and_omit_together(create_recipe, user_client):
+    create_recipe('Soup')
+    response = user_client.get('/api/recipes/?fields=id,name,text&omit=text')
+    assert set(response.json()['results'][0]) == {'id', 'name'}
+
+
+def test_unknown_fields_are_rejected(user_client):
+    response = user_client.get('/api/recipes/?fields=id,secret')
+    assert response.status_code == 400
+    assert response.json() == {'fields': 'Unknown fields: secret.'}
+    response = user_client.get('/api/users/?omit=password')
+    assert response.status_code == 400
+    assert response.json() == {'omit': 'Unknown fields: password.'}
+
+
+def test_user_fields(user, user_client):
+    response = user_client.get('/api/users/?fields=username')
+    assert response.json()['results'] == [{'username': 'reader'}]
+
+
+def test_sparse_list_skips_joins(create_recipe, user_client):
+    for name in ('Soup', 'Stew', 'Pie'):
+        create_recipe(name)
+    full, full_queries = get_queries(user_client, '/api/recipes/')
+    sparse, sparse_queries = get_queries(
+        user_client, '/api/recipes/?fields=id,name')
+    assert len(sparse_queries) < len(full_queries)
+    assert sparse['results'] == [
+        {'id': item['id'], 'name': item['name']} for item in full['results']]
+    sparse_sql = ' '.join(sparse_queries)
+    for table in ('recipes_recipe_tags', 'recipes_ingredientinrecipe',
+                  'recipes_favorite', 'recipes_shoppingcart'):
+        assert table in ' '.join(full_queries)
+        assert table not in sparse_sql
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+
+from foodgram_backend import warmup
+
+
+def test_warm_up_skips_data_without_database(monkeypatch, caplog):
+    def not_ready():
+        raise OperationalError('database is starting up')
+
+    monkeypatch.setattr('api.tags.get_tag_map', not_ready)
+    monkeypatch.setattr(warmup.gc, 'freeze', lambda: None)
+    warmup.warm_up()
+    assert 'Database is not ready' in caplog.text
+
+
+def test_startup_profile_records_cold_start(tmp_path):
+    report = tmp_path / 'startup.json'
+    call_command('startup_profile', runs=1, top=3, skip_gunicorn=True,
+                 json=str(report))
+    cold_start = json.loads(report.read_text())['cold_start']
+    assert 0 < cold_start['min'] <= cold_start['median']
+
+
+def test_startup_profile_fails_over_budget():
+    with pytest.raises(CommandError, match='cold start'):
+        call_command('startup_profile', runs=1, top=3, skip_gunicorn=True,
+                     max_cold_start=0.001)
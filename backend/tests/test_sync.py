@@ -0,0 +1,76 @@
+import pytest
+from django.db import connection
+
+
+postgresql = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='only PostgreSQL reports running transactions')
+
+
+@pytest.fixture(autouse=True)
+def no_clock_margin(settings):
+    settings.SYNC_CLOCK_MARGIN = 0
+
+
+def get_changes(client, since=''):
+    return client.get('/api/recipes/changes/', {'since': since}).json()
+
+
+def test_changes_stream(create_recipe, author_client):
+    first = create_recipe('Soup')
+    second = create_recipe('Stew')
+    changes = get_changes(author_client)
+    assert [recipe['id'] for recipe in changes['updated']] == [first, second]
+    author_client.delete(f'/api/recipes/{first}/')
+    changes = get_changes(author_client, changes['next'])
+    assert changes['updated'] == []
+    assert changes['deleted'] == [first]
+
+
+@pytest.fixture
+def other_transaction(transactional_db):
+    """
+    Open transaction of another connection, writing if asked.
+    """
+    other = connection.Database.connect(**connection.get_connection_params())
+
+    def begin(write=True):
+        with other.cursor() as cursor:
+            cursor.execute(
+                'BEGIN; SELECT txid_current()' if write else 'BEGIN; SELECT 1')
+        return other
+
+    yield begin
+    other.close()
+
+
+@postgresql
+def test_changes_wait_for_running_transactions(other_transaction,
+                                               create_recipe, author_client):
+    other = other_transaction()
+    recipe = create_recipe()
+    assert get_changes(author_client)['updated'] == []
+    other.rollback()
+    changes = get_changes(author_client)
+    assert [item['id'] for item in changes['updated']] == [recipe]
+
+
+@postgresql
+def test_reading_transactions_do_not_hold_changes(other_transaction,
+                                                  create_recipe,
+                                                  author_client):
+    other_transaction(write=False)
+    recipe = create_recipe()
+    changes = get_changes(author_client)
+    assert [item['id'] for item in changes['updated']] == [recipe]
+
+
+@postgresql
+def test_long_transactions_hold_changes_for_a_while(
+        other_transaction, create_recipe, author_client, settings, caplog):
+    other_transaction()
+    recipe = create_recipe()
+    settings.SYNC_MAX_LAG = 0
+    changes = get_changes(author_client)
+    assert [item['id'] for item in changes['updated']] == [recipe]
+    assert 'holds back the change feed' in caplog.text
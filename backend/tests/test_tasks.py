@@ -0,0 +1,63 @@
+import pytest
+from django.core.management import call_command
+from django.db import OperationalError
+
+from tasks import queue
+from tasks.models import Task
+
+
+@pytest.fixture
+def recipe_task(db):
+    queue.enqueue('recipes.update_signature', 1)
+    return Task.objects.get()
+
+
+def test_claim_retries_lost_races(recipe_task, monkeypatch):
+    take = queue.take
+    races = []
+
+    def lose_first(task, now):
+        if not races:
+            races.append(task.pk)
+            return False
+        return take(task, now)
+
+    monkeypatch.setattr(queue, 'take', lose_first)
+    assert queue.claim().pk == recipe_task.pk
+    assert races == [recipe_task.pk]
+
+
+def test_worker_failure_stops_all_workers(db, monkeypatch):
+    calls = []
+
+    def claim():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('database went away')
+        return None
+
+    monkeypatch.setattr(
+        'tasks.management.commands.run_workers.claim', claim)
+    with pytest.raises(OperationalError):
+        call_command('run_workers', threads=3, poll_interval=0.01)
+
+
+def test_workers_wait_for_database(transactional_db, settings,
+                                   monkeypatch):
+    settings.TASK_STARTUP_RETRY_INTERVAL = 0
+    release_stale = queue.release_stale
+    attempts = []
+
+    def not_ready_once():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OperationalError('database is starting up')
+        release_stale()
+
+    monkeypatch.setattr(
+        'tasks.management.commands.run_workers.release_stale',
+        not_ready_once)
+    monkeypatch.setattr(
+        'tasks.management.commands.run_workers.claim', lambda: None)
+    call_command('run_workers', threads=1, once=True)
+    assert len(attempts) == 2
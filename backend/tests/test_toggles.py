@@ -0,0 +1,117 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+TOGGLES = [
+    ('favorite', Favorite, 'Already in favorite.',
+     'Recipe not in favorite.'),
+    ('shopping_cart', ShoppingCart, 'Recipe already in list.',
+     'Recipe not in list.'),
+]
+
+
+def statements(queries):
+    """The queries of a request except the token lookup."""
+    return [query['sql'] for query in queries
+            if 'authtoken_token' not in query['sql']]
+
+
+@pytest.mark.parametrize('name, model, exists, missing', TOGGLES)
+def test_toggle_takes_two_statements(create_recipe, user, user_client,
+                                     name, model, exists, missing):
+    recipe_id = create_recipe('Soup')
+    url = f'/api/recipes/{recipe_id}/{name}/'
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.post(url)
+    assert response.status_code == 201
+    assert response.json()['id'] == recipe_id
+    assert response.json()['name'] == 'Soup'
+    assert len(statements(queries)) == 2
+    assert model.objects.filter(user=user, recipe_id=recipe_id).exists()
+    assert Recipe.objects.get(pk=recipe_id).popularity_stale
+    with CaptureQueriesContext(connection) as queries:
+        assert user_client.delete(url).status_code == 204
+    assert len(statements(queries)) == 2
+    assert not model.objects.filter(user=user).exists()
+
+
+@pytest.mark.parametrize('name, model, exists, missing', TOGGLES)
+def test_repeated_toggle_is_rejected(create_recipe, user_client,
+                                     name, model, exists, missing):
+    recipe_id = create_recipe('Soup')
+    url = f'/api/recipes/{recipe_id}/{name}/'
+    assert user_client.post(url).status_code == 201
+    response = user_client.post(url)
+    assert response.status_code == 400
+    assert response.json() == {'errors': exists}
+    assert model.objects.count() == 1
+    assert user_client.delete(url).status_code == 204
+    response = user_client.delete(url)
+    assert response.status_code == 400
+    assert response.json() == {'errors': missing}
+
+
+@pytest.mark.parametrize('name, model, exists, missing', TOGGLES)
+def test_toggle_of_missing_recipe(db, user_client,
+                                  name, model, exists, missing):
+    assert user_client.post(f'/api/recipes/999/{name}/').status_code == 404
+    assert user_client.post(f'/api/recipes/x/{name}/').status_code == 404
+    assert user_client.delete(f'/api/recipes/999/{name}/').status_code == 400
+
+
+def test_toggle_shows_in_recipe_list(transactional_db, create_recipe,
+                                     user_client):
+    recipe_id = create_recipe('Soup')
+    assert not user_client.get(
+        '/api/recipes/').json()['results'][0]['is_favorited']
+    user_client.post(f'/api/recipes/{recipe_id}/favorite/')
+    assert user_client.get(
+        '/api/recipes/').json()['results'][0]['is_favorited']
+
+
+def test_subscribe(create_recipe, user, author, user_client):
+    for name in ('Soup', 'Stew', 'Pie'):
+        create_recipe(name)
+    url = f'/api/users/{author.pk}/subscribe/'
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.post(f'{url}?recipes_limit=2')
+    assert response.status_code == 201
+    data = response.json()
+    assert data['id'] == author.pk
+    assert data['is_subscribed'] is True
+    assert data['recipes_count'] == 3
+    assert len(data['recipes']) == 2
+    assert set(data['recipes'][0]) == {'id', 'name', 'image', 'cooking_time'}
+    assert 'INSERT INTO' in statements(queries)[0]
+    assert Follow.objects.filter(user=user, author=author).exists()
+    assert len(user_client.get(
+        '/api/users/subscriptions/').json()['results']) == 1
+    assert user_client.delete(url).status_code == 204
+    assert not Follow.objects.exists()
+
+
+def test_repeated_subscribe_is_rejected(user_client, author):
+    url = f'/api/users/{author.pk}/subscribe/'
+    assert user_client.post(url).status_code == 201
+    response = user_client.post(url)
+    assert response.status_code == 400
+    assert response.json() == {'errors': 'Already exist subscribe.'}
+    assert Follow.objects.count() == 1
+    assert user_client.delete(url).status_code == 204
+    response = user_client.delete(url)
+    assert response.status_code == 400
+    assert response.json() == {'errors': 'No subscribe.'}
+
+
+def test_self_subscribe_is_rejected(user, user_client):
+    response = user_client.post(f'/api/users/{user.pk}/subscribe/')
+    assert response.status_code == 400
+    assert response.json() == {'errors': 'You don\'t subscribe to yourself.'}
+    assert not Follow.objects.exists()
+
+
+def test_subscribe_to_missing_user(db, user_client):
+    assert user_client.post('/api/users/999/subscribe/').status_code == 404
@@ -0,0 +1,71 @@
+import base64
+import json
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from recipes.models import Recipe
+from tests.conftest import IMAGE
+
+PNG = base64.b64decode(IMAGE.split(';base64,')[1])
+
+
+@pytest.fixture
+def temp_dir(settings, tmp_path):
+    settings.FILE_UPLOAD_TEMP_DIR = str(tmp_path / 'uploads')
+    os.mkdir(settings.FILE_UPLOAD_TEMP_DIR)
+    return settings.FILE_UPLOAD_TEMP_DIR
+
+
+def post_form(client, recipe_data, image, name='image.png',
+              content_type='image/png'):
+    data = recipe_data()
+    data['ingredients'] = json.dumps(data['ingredients'])
+    data['image'] = SimpleUploadedFile(name, image, content_type)
+    return client.post('/api/recipes/', data, format='multipart')
+
+
+def test_multipart_image(author_client, recipe_data, settings, temp_dir):
+    response = post_form(author_client, recipe_data, PNG)
+    assert response.status_code == 201, response.content
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    with open(os.path.join(settings.MEDIA_ROOT, recipe.image.name),
+              'rb') as file:
+        assert file.read() == PNG
+    assert recipe.tags.count() == 1
+    assert recipe.ingridientinrecipe.count() == 2
+
+
+@pytest.mark.parametrize('image, content_type', [
+    (b'not an image at all', 'image/png'),
+    (PNG, 'text/plain'),
+])
+def test_bad_image_is_rejected(author_client, recipe_data, temp_dir,
+                               image, content_type):
+    response = post_form(author_client, recipe_data, image,
+                         content_type=content_type)
+    assert response.status_code == 400
+    assert response.json() == {'image': ['Unsupported image type.']}
+    assert os.listdir(temp_dir) == []
+    assert not Recipe.objects.exists()
+
+
+def test_large_image_is_rejected(author_client, recipe_data, settings,
+                                 temp_dir):
+    settings.RECIPE_IMAGE_MAX_SIZE = len(PNG) + 100
+    response = post_form(author_client, recipe_data, PNG + bytes(200))
+    assert response.status_code == 400
+    assert response.json() == {'image': ['Image is too large.']}
+    assert os.listdir(temp_dir) == []
+
+
+def test_large_body_is_rejected_by_length(author_client, recipe_data,
+                                          settings, temp_dir):
+    settings.RECIPE_IMAGE_MAX_SIZE = 1000
+    settings.DATA_UPLOAD_MAX_MEMORY_SIZE = 1000
+    response = post_form(author_client, recipe_data, PNG + bytes(5000))
+    assert response.status_code == 400
+    assert response.json() == {'image': ['Image is too large.']}
+    assert os.listdir(temp_dir) == []
+    assert not Recipe.objects.exists()
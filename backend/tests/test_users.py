@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe
+from tests.conftest import make_user
+from users.models import Follow
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url).status_code == 200
+    return len(queries)
+
+
+def add_authors(user, names):
+    for name in names:
+        author = make_user(name)
+        Follow.objects.create(user=user, author=author)
+        for number in range(2):
+            Recipe.objects.create(
+                author=author, name=f'{name} {number}', text='text',
+                cooking_time=5, image='recipes/media/soup.png')
+
+
+def test_users_list_queries_do_not_grow(user, user_client):
+    add_authors(user, ['first'])
+    one = count_queries(user_client, '/api/users/')
+    add_authors(user, ['second', 'third', 'fourth'])
+    assert count_queries(user_client, '/api/users/') == one
+    data = user_client.get('/api/users/').json()['results']
+    assert {item['username']: item['is_subscribed'] for item in data} == {
+        'reader': False, 'first': True, 'second': True, 'third': True,
+        'fourth': True}
+
+
+def test_subscriptions_queries_do_not_grow(user, user_client):
+    url = '/api/users/subscriptions/?recipes_limit=1'
+    add_authors(user, ['first'])
+    one = count_queries(user_client, url)
+    add_authors(user, ['second', 'third', 'fourth'])
+    assert count_queries(user_client, url) == one
+    data = user_client.get(url).json()['results']
+    assert len(data) == 4
+    assert all(len(item['recipes']) == 1 and item['recipes_count'] == 2
+               for item in data)
@@ -1,12 +1,25 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+
+from foodgram_backend.pagination import EstimatedCountPaginator
+from recipes.deletion import CascadeDeleteAdminMixin, delete_users
 from users.models import Follow, User
 
 
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(CascadeDeleteAdminMixin, UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name')
     search_fields = ('username', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    delete_function = staticmethod(delete_users)
 
 
-admin.site.register(Follow)
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('user', 'author',)
+    list_select_related = ('user', 'author',)
+    search_fields = ('user__username', 'author__username',)
+    autocomplete_fields = ('user', 'author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
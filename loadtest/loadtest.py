@@ -0,0 +1,317 @@
+"""
+Load test of the Foodgram API.
+
+Operations are taken from docs/openapi-schema.yml by operationId, request
+bodies for registration and login from the Postman collection. Virtual
+users run weighted journeys against a running server and the report shows
+throughput, latency percentiles and error rate per endpoint.
+
+    python loadtest/loadtest.py --base-url http://127.0.0.1:8000 \
+        --concurrency 10 --duration 60
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA = ROOT / 'docs' / 'openapi-schema.yml'
+COLLECTION = ROOT / 'postman-collection' / 'diploma.postman_collection.json'
+VARIABLE = re.compile(r'{{(\w+)}}')
+
+LIST_RECIPES = 'Список рецептов'
+GET_RECIPE = 'Получение рецепта'
+ADD_FAVORITE = 'Добавить рецепт в избранное'
+REMOVE_FAVORITE = 'Удалить рецепт из избранного'
+ADD_TO_CART = 'Добавить рецепт в список покупок'
+REMOVE_FROM_CART = 'Удалить рецепт из списка покупок'
+DOWNLOAD_CART = 'Скачать список покупок'
+SUBSCRIBE = 'Подписаться на пользователя'
+UNSUBSCRIBE = 'Отписаться от пользователя'
+SUBSCRIPTIONS = 'Мои подписки'
+LIST_TAGS = 'Cписок тегов'
+LIST_USERS = 'Список пользователей'
+REGISTER = 'Регистрация пользователя'
+LOGIN = 'Получить токен авторизации'
+CURRENT_USER = 'Текущий пользователь'
+MAX_PAGES = 3
+
+
+def load_operations(path=SCHEMA):
+    """
+    Method and path of every operation of the schema by its operationId.
+    """
+    with open(path, encoding='utf-8') as file:
+        schema = yaml.safe_load(file)
+    operations = {}
+    for url, methods in schema['paths'].items():
+        for method, operation in methods.items():
+            operations[operation['operationId']] = (method.upper(), url)
+    return operations
+
+
+def load_bodies(path=COLLECTION):
+    """
+    Raw request bodies of the Postman collection by request name.
+    """
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    bodies = {}
+    stack = list(collection['item'])
+    while stack:
+        item = stack.pop()
+        if 'item' in item:
+            stack.extend(item['item'])
+            continue
+        body = item['request'].get('body', {})
+        if body.get('mode') == 'raw':
+            name = item['name'].split('//')[0].strip()
+            bodies.setdefault(name, body['raw'])
+    return bodies
+
+
+def render_body(template, variables):
+    """
+    Substitute Postman {{variables}} with JSON values.
+    """
+    return json.loads(VARIABLE.sub(
+        lambda match: json.dumps(variables[match.group(1)]), template))
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.exceptions = defaultdict(int)
+
+    def add(self, name, latency, ok):
+        with self.lock:
+            self.latencies[name].append(latency)
+            if not ok:
+                self.errors[name] += 1
+
+    def add_exception(self, name):
+        with self.lock:
+            self.exceptions[name] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for name, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            rows.append({
+                'endpoint': name,
+                'requests': len(latencies),
+                'rps': len(latencies) / elapsed,
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1],
+                'error_rate': self.errors[name] / len(latencies),
+            })
+        return rows
+
+
+def percentile(values, percent):
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class Client:
+    """
+    HTTP session of one virtual user.
+    """
+
+    def __init__(self, base_url, operations, stats, token=None):
+        self.base_url = base_url.rstrip('/')
+        self.operations = operations
+        self.stats = stats
+        self.user_id = None
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+
+    def call(self, operation, params=None, json_body=None, **path):
+        method, url = self.operations[operation]
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + url.format(**path),
+                params=params, json=json_body, timeout=30)
+        except requests.RequestException:
+            self.stats.add(f'{method} {url}', time.perf_counter() - start,
+                           False)
+            return None
+        self.stats.add(f'{method} {url}', time.perf_counter() - start,
+                       response.ok)
+        return response
+
+
+class LoadTest:
+    def __init__(self, options):
+        self.options = options
+        self.operations = load_operations()
+        self.bodies = load_bodies()
+        self.stats = Stats()
+        self.tokens = []
+        self.tags = []
+        self.recipes = []
+        self.authors = []
+        self.pages = 1
+        self.journeys = (
+            (self.browse_feed, 40),
+            (self.filter_by_tags, 20),
+            (self.favorite, 15),
+            (self.shopping_cart, 15),
+            (self.subscribe, 10),
+        )
+
+    def setup(self):
+        """
+        Register virtual users and collect ids for the journeys.
+        """
+        setup = Client(self.options.base_url, self.operations, Stats())
+        for _ in range(self.options.users):
+            suffix = uuid.uuid4().hex[:10]
+            variables = {
+                'email': f'load_{suffix}@example.org',
+                'username': f'load_{suffix}',
+                'password': f'Load-{suffix}-password',
+            }
+            setup.call(REGISTER, json_body=render_body(
+                self.bodies['create_first_user'], variables))
+            response = setup.call(LOGIN, json_body=render_body(
+                self.bodies['get_token_for_first_user'], variables))
+            if response is not None and response.ok:
+                self.tokens.append(response.json()['auth_token'])
+        if len(self.tokens) < self.options.concurrency:
+            raise SystemExit('Could not register a user for every worker.')
+        client = Client(self.options.base_url, self.operations, Stats(),
+                        self.tokens[0])
+        self.tags = [tag['slug'] for tag in client.call(LIST_TAGS).json()]
+        first_page = client.call(LIST_RECIPES).json()
+        page_size = max(1, len(first_page['results']))
+        self.pages = max(1, min(MAX_PAGES,
+                                -(-first_page['count'] // page_size)))
+        self.recipes = [
+            recipe['id'] for page in range(1, self.pages + 1)
+            for recipe in client.call(
+                LIST_RECIPES, params={'page': page}).json()['results']
+        ]
+        self.authors = [user['id'] for user in client.call(
+            LIST_USERS).json()['results']]
+        if not self.recipes:
+            raise SystemExit('The server has no recipes to load.')
+
+    def browse_feed(self, client):
+        for page in range(1, random.randint(1, self.pages) + 1):
+            client.call(LIST_RECIPES, params={'page': page})
+        client.call(GET_RECIPE, id=random.choice(self.recipes))
+
+    def filter_by_tags(self, client):
+        tags = random.sample(self.tags, min(len(self.tags),
+                                            random.randint(1, 2)))
+        client.call(LIST_RECIPES, params={'tags': tags})
+        client.call(LIST_RECIPES, params={'tags': tags, 'is_favorited': 1})
+
+    def favorite(self, client):
+        recipe = random.choice(self.recipes)
+        client.call(LIST_RECIPES)
+        client.call(ADD_FAVORITE, id=recipe)
+        client.call(LIST_RECIPES, params={'is_favorited': 1})
+        client.call(REMOVE_FAVORITE, id=recipe)
+
+    def shopping_cart(self, client):
+        recipe = random.choice(self.recipes)
+        client.call(ADD_TO_CART, id=recipe)
+        client.call(DOWNLOAD_CART)
+        client.call(REMOVE_FROM_CART, id=recipe)
+
+    def subscribe(self, client):
+        author = random.choice(self.authors)
+        if author == client.user_id:
+            return
+        client.call(SUBSCRIBE, id=author)
+        client.call(SUBSCRIPTIONS)
+        client.call(UNSUBSCRIBE, id=author)
+
+    def worker(self, number, deadline):
+        """
+        A journey failing on an unexpected response is counted as an
+        exception and the worker goes on with the next one.
+        """
+        client = Client(self.options.base_url, self.operations, self.stats,
+                        self.tokens[number])
+        client.user_id = client.call(CURRENT_USER).json()['id']
+        journeys, weights = zip(*self.journeys)
+        while time.monotonic() < deadline:
+            journey = random.choices(journeys, weights)[0]
+            try:
+                journey(client)
+            except Exception:
+                self.stats.add_exception(journey.__name__)
+
+    def run(self):
+        """
+        Every worker gets its own virtual user, so journeys of different
+        workers never conflict with each other.
+        """
+        self.setup()
+        start = time.monotonic()
+        deadline = start + self.options.duration
+        with ThreadPoolExecutor(self.options.concurrency) as executor:
+            futures = [executor.submit(self.worker, number, deadline)
+                       for number in range(self.options.concurrency)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                self.stats.add_exception('worker')
+        return self.stats.report(time.monotonic() - start)
+
+
+def print_report(rows, exceptions):
+    print(f'{"endpoint":<45} {"reqs":>7} {"rps":>8} {"p50 ms":>8} '
+          f'{"p90 ms":>8} {"p99 ms":>8} {"max ms":>8} {"errors":>7}')
+    for row in rows:
+        print(f'{row["endpoint"]:<45} {row["requests"]:>7} '
+              f'{row["rps"]:>8.1f} {row["p50"] * 1000:>8.1f} '
+              f'{row["p90"] * 1000:>8.1f} {row["p99"] * 1000:>8.1f} '
+              f'{row["max"] * 1000:>8.1f} {row["error_rate"]:>7.1%}')
+    for name, count in sorted(exceptions.items()):
+        print(f'Exceptions in {name}: {count}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--users', type=int,
+                        help='Virtual users to register, one per worker '
+                             'by default.')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Seconds to run the journeys.')
+    parser.add_argument('--json', help='Also write the report to this file.')
+    options = parser.parse_args()
+    options.users = max(options.users or 0, options.concurrency)
+    load_test = LoadTest(options)
+    rows = load_test.run()
+    exceptions = dict(load_test.stats.exceptions)
+    print_report(rows, exceptions)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as file:
+            json.dump({'endpoints': rows, 'exceptions': exceptions}, file,
+                      ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()